@@ -2,17 +2,77 @@
 """
 This module provides functions for securely hashing passwords and
 verifying hashed passwords using the bcrypt library.
+
+The work factor is BCRYPT_ROUNDS (12), or with BCRYPT_ROUNDS=auto the
+highest one hashing within BCRYPT_TARGET_MS milliseconds (250) on this
+host, between MIN_ROUNDS and MAX_ROUNDS.
 """
 
+from functools import lru_cache
 import bcrypt
+import os
+import time
+
+DEFAULT_ROUNDS = 12
+MIN_ROUNDS = 10
+MAX_ROUNDS = 16
+
+
+def calibrate_rounds(target_ms: float) -> int:
+    """
+    Finds the highest work factor hashing within a latency budget.
+
+    A hash at 8 rounds is timed and each extra round doubles the time.
 
+    Args:
+        target_ms (float): The hashing time budget in milliseconds.
 
-def hash_password(password: str) -> bytes:
+    Returns:
+        int: The work factor, between MIN_ROUNDS and MAX_ROUNDS.
+    """
+    salt = bcrypt.gensalt(8)
+    elapsed = float('inf')
+    for _ in range(3):
+        start = time.perf_counter()
+        bcrypt.hashpw(b'calibration', salt)
+        elapsed = min(elapsed, time.perf_counter() - start)
+    rounds = MIN_ROUNDS
+    while (rounds < MAX_ROUNDS and
+           elapsed * 2 ** (rounds + 1 - 8) * 1000 <= target_ms):
+        rounds += 1
+    return rounds
+
+
+@lru_cache(maxsize=None)
+def bcrypt_rounds() -> int:
+    """
+    Returns the work factor of new hashes, calibrated on first use
+    when BCRYPT_ROUNDS is "auto".
+
+    Returns:
+        int: The work factor.
+    """
+    rounds = os.getenv('BCRYPT_ROUNDS')
+    if rounds == 'auto':
+        try:
+            target_ms = float(os.getenv('BCRYPT_TARGET_MS'))
+        except Exception:
+            target_ms = 250
+        return calibrate_rounds(target_ms)
+    try:
+        rounds = int(rounds)
+    except Exception:
+        return DEFAULT_ROUNDS
+    return rounds if 4 <= rounds <= 31 else DEFAULT_ROUNDS
+
+
+def hash_password(password: str, rounds: int = None) -> bytes:
     """
     Hashes a plain-text password using bcrypt.
 
     Args:
         password (str): The plain-text password to be hashed.
+        rounds (int): The work factor, bcrypt_rounds() by default.
 
     Returns:
         bytes: The hashed password in bytes format, including the salt.
@@ -22,7 +82,32 @@ def hash_password(password: str) -> bytes:
         >>> print(hashed)
         b'$2b$12$KIXG9zq5DB0Jc3F.H1uj.eI4owG2V4FfJ/wJZh9isrF5lIVY8UBK6'
     """
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+    return bcrypt.hashpw(password.encode('utf-8'),
+                         bcrypt.gensalt(rounds or bcrypt_rounds()))
+
+
+def needs_rehash(hashed_password: bytes, rounds: int = None) -> bool:
+    """
+    Tells whether a hash was made with a lower work factor. Hashes with a
+    higher one are kept, so that processes calibrating slightly different
+    factors with BCRYPT_ROUNDS=auto don't rehash each other's hashes.
+
+    Args:
+        hashed_password (bytes): The previously hashed password.
+        rounds (int): The expected work factor, bcrypt_rounds() by default.
+
+    Returns:
+        bool: True if the password should be hashed again.
+
+    Example:
+        >>> needs_rehash(hash_password("my_secret_password", 10), 12)
+        True
+    """
+    try:
+        cost = int(hashed_password.split(b'$')[2])
+    except (IndexError, ValueError):
+        return True
+    return cost < (rounds or bcrypt_rounds())
 
 
 def is_valid(hashed_password: bytes, password: str) -> bool:
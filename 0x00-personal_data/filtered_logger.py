@@ -1,10 +1,14 @@
 #!/usr/bin/env python3
 """Redacts sensitive information in a message based on
         the specified fields."""
+from functools import lru_cache
 import re
-from typing import List
+from typing import Dict, List, Pattern, Tuple
 import logging
 import os
+import queue
+import sys
+import threading
 import mysql.connector
 
 PII_FIELDS = ('name', 'email', 'phone', 'ssn', 'password')
@@ -12,6 +16,12 @@ PII_FIELDS = ('name', 'email', 'phone', 'ssn', 'password')
 
 class RedactingFormatter(logging.Formatter):
     """ Redacting Formatter class
+
+        A record logged with a dict of fields, e.g.
+        logger.info("", extra={"fields": {"name": ...}}), has the
+        values of the redacted fields replaced by key, then the fields
+        rendered as "key=value;" after its message, which is redacted
+        with the fields pattern like the whole output of other records.
         """
 
     REDACTION = "***"
@@ -21,12 +31,67 @@ class RedactingFormatter(logging.Formatter):
     def __init__(self, fields: List[str]):
         """constructor for redactformatter"""
         self._logrecord = fields
+        self._pattern = redaction_pattern(tuple(fields), self.SEPARATOR)
+        self._redacted = frozenset(fields)
         super(RedactingFormatter, self).__init__(self.FORMAT)
 
+    def render_fields(self, fields: Dict[str, object]) -> str:
+        """render fields as "key=value;", redacting by key"""
+        redacted = self._redacted
+        redaction = "=" + self.REDACTION + self.SEPARATOR
+        separator = self.SEPARATOR
+        return " ".join(
+            key + redaction if key in redacted
+            else "{}={}{}".format(key, value, separator)
+            for key, value in fields.items())
+
+    def format_fields(self, record: logging.LogRecord,
+                      fields: Dict[str, object]) -> str:
+        """format a record logged with fields, without changing it as
+        other handlers may be formatting it at the same time"""
+        message = record.getMessage()
+        if message and self._pattern is not None:
+            message = self._pattern.sub(
+                self.REDACTION + self.SEPARATOR, message)
+        rendered = self.render_fields(fields)
+        values = dict(record.__dict__, message=message + " " + rendered
+                      if message else rendered)
+        if self.usesTime():
+            values['asctime'] = self.formatTime(record, self.datefmt)
+        text = self._fmt % values
+        if record.exc_info:
+            text += "\n" + self.formatException(record.exc_info)
+        if record.stack_info:
+            text += "\n" + self.formatStack(record.stack_info)
+        return text
+
     def format(self, record: logging.LogRecord) -> str:
         """format the output"""
-        return filter_datum(self._logrecord, self.REDACTION,
-                            super().format(record), self.SEPARATOR)
+        fields = getattr(record, 'fields', None)
+        if isinstance(fields, dict):
+            return self.format_fields(record, fields)
+        message = super().format(record)
+        if self._pattern is None:
+            return message
+        return self._pattern.sub(self.REDACTION + self.SEPARATOR, message)
+
+
+@lru_cache(maxsize=128)
+def redaction_pattern(fields: Tuple[str, ...],
+                      separator: str) -> Pattern:
+    """ Compiles the pattern matching the values of all the fields, or
+        returns None when there are no fields.
+
+        The lookbehinds sit in one alternation, so a message is scanned
+        once whatever the number of fields, and are only tried after an
+        "=".
+    """
+    if not fields:
+        return None
+    lookbehinds = "|".join(
+        "(?<={}=)".format(re.escape(field)) for field in fields)
+    return re.compile(
+        r"(?<==)(?:{}).*?{}".format(lookbehinds, re.escape(separator)))
 
 
 def filter_datum(fields: List[str], redaction: str, message: str,
@@ -34,10 +99,104 @@ def filter_datum(fields: List[str], redaction: str, message: str,
     """ Redacts sensitive information in a message based on
         the specified fields.
     """
-    for field in fields:
-        pattern = r"(?<={}=).*?{}".format(field, separator)
-        message = re.sub(pattern, redaction + separator, message)
-    return message
+    pattern = redaction_pattern(tuple(fields), separator)
+    if pattern is None:
+        return message
+    return pattern.sub(redaction + separator, message)
+
+
+class QueuedStreamHandler(logging.Handler):
+    """ Stream handler writing from a background thread
+
+        Records are queued on the logging thread; the listener thread
+        formats them and writes each batch of up to batch_size records
+        with a single write and flush. When the queue holds maxsize
+        records, the "block" policy makes the logging thread wait and
+        the "drop" policy discards the record. Messages are formatted
+        on the listener thread, so their arguments and fields must not
+        be changed once logged.
+        """
+
+    terminator = "\n"
+
+    def __init__(self, stream=None, maxsize: int = 10000,
+                 policy: str = 'block', batch_size: int = 256):
+        """constructor for queuedstreamhandler"""
+        super(QueuedStreamHandler, self).__init__()
+        self.stream = stream if stream is not None else sys.stderr
+        self.queue = queue.Queue(maxsize)
+        self.policy = policy
+        self.batch_size = batch_size
+        self._max_depth = 0
+        self._dropped = 0
+        self._written = 0
+        self._closed = False
+        self._listener = threading.Thread(
+            target=self._listen, name='QueuedStreamHandler', daemon=True)
+        self._listener.start()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """queue a record for the listener"""
+        if self.policy == 'drop':
+            try:
+                self.queue.put_nowait(record)
+            except queue.Full:
+                self._dropped += 1
+                return
+        else:
+            self.queue.put(record)
+        depth = self.queue.qsize()
+        if depth > self._max_depth:
+            self._max_depth = depth
+
+    def _listen(self) -> None:
+        """format and write the queued records until close"""
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines = []
+            for record in batch:
+                if record is None:
+                    continue
+                try:
+                    lines.append(self.format(record) + self.terminator)
+                except Exception:
+                    self.handleError(record)
+            if lines:
+                try:
+                    self.stream.write("".join(lines))
+                    self.stream.flush()
+                    self._written += len(lines)
+                except Exception:
+                    self.handleError(batch[-1])
+            if None in batch:
+                return
+
+    def metrics(self) -> Dict[str, int]:
+        """queue depth, highest depth, and records dropped and written"""
+        return {
+            'depth': self.queue.qsize(),
+            'max_depth': self._max_depth,
+            'maxsize': self.queue.maxsize,
+            'dropped': self._dropped,
+            'written': self._written,
+        }
+
+    def close(self) -> None:
+        """write the queued records, then stop the listener"""
+        self.acquire()
+        try:
+            if not self._closed:
+                self._closed = True
+                self.queue.put(None)
+                self._listener.join()
+        finally:
+            self.release()
+        super(QueuedStreamHandler, self).close()
 
 
 def get_logger() -> logging.Logger:
@@ -46,14 +205,31 @@ def get_logger() -> logging.Logger:
     The logger is configured to log messages at the INFO level and
     outputs them to the console with redacted sensitive information.
 
+    With USER_DATA_LOG_QUEUE_SIZE above 0, records are formatted and
+    written by a QueuedStreamHandler queueing that many records, which
+    blocks or drops records when full as USER_DATA_LOG_QUEUE_POLICY
+    ("block" or "drop") says.
+
     Returns:
         logging.Logger: Configured logger instance.
     """
     logger = logging.getLogger('user_data')
     logger.setLevel(logging.INFO)
 
-    # Create a stream handler
-    file_handler = logging.StreamHandler()
+    try:
+        queue_size = int(os.getenv('USER_DATA_LOG_QUEUE_SIZE'))
+    except Exception:
+        queue_size = 0
+
+    # Create a stream handler, or a queued one
+    if queue_size > 0:
+        policy = os.getenv('USER_DATA_LOG_QUEUE_POLICY', 'block')
+        if policy not in ('block', 'drop'):
+            policy = 'block'
+        file_handler = QueuedStreamHandler(maxsize=queue_size,
+                                           policy=policy)
+    else:
+        file_handler = logging.StreamHandler()
 
     # Set the formatter for the handler
     file_handler.setFormatter(RedactingFormatter(list(PII_FIELDS)))
@@ -91,15 +267,8 @@ def main():
     cursor.execute("SELECT * FROM users;")
     logger = get_logger()
     for row in cursor:
-        message = f"name={row[0]}; " + \
-                  f"email={row[1]}; " + \
-                  f"phone={row[2]}; " + \
-                  f"ssn={row[3]}; " + \
-                  f"password={row[4]}; " + \
-                  f"ip={row[5]}; " + \
-                  f"last_login={row[6]}; " + \
-                  f"user_agent={row[7]};"
-        logger.info(message)
+        logger.info("", extra={"fields": dict(zip(cursor.column_names,
+                                                  row))})
     cursor.close()
     db.close()
 
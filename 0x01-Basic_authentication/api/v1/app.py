@@ -6,6 +6,7 @@ from os import getenv
 from api.v1.views import app_views
 from flask import Flask, jsonify, abort, request
 from flask_cors import (CORS, cross_origin)
+from api.v1.auth.auth import PathMatcher
 import os
 
 
@@ -20,6 +21,12 @@ elif os.getenv('AUTH_TYPE') == 'auth':
     from api.v1.auth.auth import Auth
     auth = Auth()
 
+excluded_paths = PathMatcher([
+    '/api/v1/status/',
+    '/api/v1/unauthorized/',
+    '/api/v1/forbidden/'
+])
+
 
 @app.before_request
 def before_request() -> None:
@@ -31,12 +38,7 @@ def before_request() -> None:
     """
     if auth is None:
         return
-    if auth.require_auth(request.path,
-                         ['/api/v1/status/',
-                          '/api/v1/unauthorized/',
-                          '/api/v1/forbidden/'
-                          ]
-                         ):
+    if auth.require_auth(request.path, excluded_paths):
         if not auth.authorization_header(request):
             abort(401)
         if not auth.current_user(request):
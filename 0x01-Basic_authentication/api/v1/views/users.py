@@ -2,18 +2,66 @@
 """ Module of Users views
 """
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from flask import (abort, jsonify, request, Response, stream_with_context,
+                   url_for)
+from itertools import islice
 from models.user import User
+import json
+
+
+def stream_json_list(objs) -> Response:
+    """ Stream a JSON array of objects, one object at a time
+    """
+    def generate():
+        yield '['
+        for i, obj in enumerate(objs):
+            yield (',' if i > 0 else '') + json.dumps(obj.to_json())
+        yield ']'
+    return Response(stream_with_context(generate()),
+                    mimetype='application/json')
 
 
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """ GET /api/v1/users
+    Query parameters (optional):
+      - limit: max number of User objects, ordered by ID
+      - after: ID of the last User of the previous page
+      - stream: if "true", the JSON list is streamed, ordered by ID
     Return:
       - list of all User objects JSON represented
+      - a Link header to the next page when paginated
+      - 400 if limit is not a positive integer
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    limit = request.args.get('limit')
+    after = request.args.get('after')
+    stream = request.args.get('stream') == 'true'
+    next_url = None
+    if limit is not None or after is not None:
+        try:
+            limit = int(limit) if limit is not None else None
+        except ValueError:
+            limit = 0
+        if limit is not None and limit <= 0:
+            return jsonify({'error': "Wrong limit"}), 400
+        users = User.iter_by_id(after)
+        if limit is not None:
+            users = list(islice(users, limit))
+            if len(users) == limit:
+                next_url = url_for('app_views.view_all_users', limit=limit,
+                                   after=users[-1].id)
+    elif stream:
+        users = User.iter_by_id()
+    else:
+        users = User.all()
+
+    if stream:
+        response = stream_json_list(users)
+    else:
+        response = jsonify([user.to_json() for user in users])
+    if next_url is not None:
+        response.headers['Link'] = '<{}>; rel="next"'.format(next_url)
+    return response
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
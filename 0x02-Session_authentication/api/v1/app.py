@@ -6,6 +6,7 @@ from os import getenv
 from api.v1.views import app_views
 from flask import Flask, jsonify, abort, request
 from flask_cors import (CORS, cross_origin)
+from api.v1.auth.auth import PathMatcher
 import os
 
 
@@ -28,6 +29,16 @@ elif os.getenv('AUTH_TYPE') == 'session_exp_auth':
 elif os.getenv('AUTH_TYPE') == 'session_db_auth':
     from api.v1.auth.session_db_auth import SessionDBAuth
     auth = SessionDBAuth()
+elif os.getenv('AUTH_TYPE') == 'session_token_auth':
+    from api.v1.auth.session_token_auth import SessionTokenAuth
+    auth = SessionTokenAuth()
+
+excluded_paths = PathMatcher([
+    '/api/v1/status/',
+    '/api/v1/unauthorized/',
+    '/api/v1/forbidden/',
+    '/api/v1/auth_session/login/'
+])
 
 
 @app.before_request
@@ -40,13 +51,7 @@ def before_request() -> None:
     """
     if auth is None:
         return
-    if auth.require_auth(request.path,
-                         ['/api/v1/status/',
-                          '/api/v1/unauthorized/',
-                          '/api/v1/forbidden/',
-                          '/api/v1/auth_session/login/'
-                          ]
-                         ):
+    if auth.require_auth(request.path, excluded_paths):
         if not auth.authorization_header(request) and \
                 not auth.session_cookie(request):
             print(f'am in b4 req')
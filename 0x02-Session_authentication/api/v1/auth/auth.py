@@ -3,11 +3,69 @@
     API Authentication manager module
 """
 from flask import request
-from typing import List, TypeVar
+from functools import lru_cache
+from typing import List, TypeVar, Union
 import re
 from os import getenv
 
 
+class PathMatcher:
+    """
+    Compiled set of paths excluded from authentication
+
+    Entries ending with '*' match every path starting with what comes
+    before the '*', other entries match the exact path. The entries are
+    merged in a prefix trie which is compiled into a single regex, so a
+    path is matched in one pass whatever the number of entries.
+    """
+    def __init__(self, excluded_paths: List[str]):
+        """ Build the trie of the excluded paths and compile it
+        """
+        trie = {}
+        for excluded_path in excluded_paths:
+            node = trie
+            wildcard = excluded_path.endswith('*')
+            if wildcard:
+                excluded_path = excluded_path[:-1]
+            for char in excluded_path:
+                node = node.setdefault(char, {})
+            # keys are single chars: '' marks an exact path, None a prefix
+            node[None if wildcard else ''] = True
+        self._regex = re.compile(self._pattern(trie)) if trie else None
+
+    @classmethod
+    def _pattern(cls, node: dict) -> str:
+        """ Regex matching the paths of a trie node
+        """
+        if None in node:
+            return ''
+        alternatives = []
+        for char, child in node.items():
+            if char == '':
+                alternatives.append(r'\Z')
+            else:
+                alternatives.append(re.escape(char) + cls._pattern(child))
+        if len(alternatives) == 1:
+            return alternatives[0]
+        return '(?:{})'.format('|'.join(alternatives))
+
+    def match(self, path: str) -> bool:
+        """ Check if a path is excluded, a '/' is appended if missing
+        """
+        if self._regex is None:
+            return False
+        if not path.endswith('/'):
+            path += '/'
+        return self._regex.match(path) is not None
+
+
+@lru_cache(maxsize=32)
+def compile_excluded_paths(excluded_paths: tuple) -> PathMatcher:
+    """ Memoized PathMatcher of a tuple of excluded paths
+    """
+    return PathMatcher(excluded_paths)
+
+
 class Auth:
     """
     Authentication Class Manager
@@ -35,12 +93,13 @@ class Auth:
     Return:
     - the current user
     """
-    def require_auth(self, path: str, excluded_paths: List[str]) -> bool:
+    def require_auth(self, path: str,
+                     excluded_paths: Union[List[str], PathMatcher]) -> bool:
         """ Check if authentication is required for the given path.
 
         Args:
             path (str): The path to check for authentication requirement.
-            excluded_paths (List[str]): List of paths excluded
+            excluded_paths (List[str] or PathMatcher): Paths excluded
                                         from authentication.
 
         Returns:
@@ -48,16 +107,9 @@ class Auth:
         """
         if path is None or excluded_paths is None:
             return True
-        if not path.endswith('/'):
-            path += '/'
-        for excluded_path in excluded_paths:
-            if excluded_path.endswith('*'):
-                if re.match(re.escape(excluded_path[:-1]), path):
-                    return False
-            elif excluded_path == path:
-                return False
-
-        return True
+        if not isinstance(excluded_paths, PathMatcher):
+            excluded_paths = compile_excluded_paths(tuple(excluded_paths))
+        return not excluded_paths.match(path)
 
     def authorization_header(self, request=None) -> str:
         """Return the Authorization header value from the request.
@@ -3,13 +3,37 @@
     API Basic Authentication manager module
 """
 from api.v1.auth.auth import Auth
+from collections import OrderedDict
 from models.user import User
 from typing import List, TypeVar
 import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
 
 
 class BasicAuth(Auth):
-    """Basic Authentication class"""
+    """Basic Authentication class
+
+    Verified Authorization headers are cached, keyed by an HMAC of the
+    header, for BASIC_AUTH_CACHE_TTL seconds (BASIC_AUTH_CACHE_SIZE
+    entries at most). An entry is dropped as soon as its user is removed
+    or its password changes.
+    """
+    _cache_key = os.urandom(32)
+    _cache = OrderedDict()
+    _cache_lock = threading.Lock()
+    try:
+        cache_ttl = float(os.getenv('BASIC_AUTH_CACHE_TTL'))
+    except Exception:
+        cache_ttl = 60
+    try:
+        cache_size = int(os.getenv('BASIC_AUTH_CACHE_SIZE'))
+    except Exception:
+        cache_size = 1024
+
     def extract_base64_authorization_header(self,
                                             authorization_header: str) -> str:
         """Extracts the Base64 part of the Authorization header."""
@@ -65,15 +89,59 @@ class BasicAuth(Auth):
             pass
         return None
 
+    def _cache_digest(self, authorization_header: str) -> bytes:
+        """Keyed digest of an Authorization header, used as cache key."""
+        return hmac.new(self._cache_key, authorization_header.encode(),
+                        hashlib.sha256).digest()
+
+    def cached_user(self, authorization_header: str) -> TypeVar('User'):
+        """Returns the User of an already verified Authorization header."""
+        if authorization_header is None or \
+                not isinstance(authorization_header, str) or \
+                self.cache_ttl <= 0:
+            return None
+        digest = self._cache_digest(authorization_header)
+        with self._cache_lock:
+            entry = self._cache.get(digest)
+            if entry is None:
+                return None
+            user_id, password, expires_at = entry
+            user = User.get(user_id)
+            if expires_at < time.monotonic() or user is None or \
+                    user.password != password:
+                del self._cache[digest]
+                return None
+            self._cache.move_to_end(digest)
+        return user
+
+    def cache_user(self, authorization_header: str, user: TypeVar('User')):
+        """Remembers the User of a verified Authorization header."""
+        if self.cache_ttl <= 0 or self.cache_size <= 0:
+            return
+        digest = self._cache_digest(authorization_header)
+        with self._cache_lock:
+            self._cache[digest] = (user.id, user.password,
+                                   time.monotonic() + self.cache_ttl)
+            self._cache.move_to_end(digest)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
     def current_user(self, request=None) -> TypeVar('User'):
         """ gets the current logged in user
             Return:
             - the current user
         """
+        authorization_header = self.authorization_header(request)
+        user = self.cached_user(authorization_header)
+        if user is not None:
+            return user
         base_64_part = self.extract_base64_authorization_header(
-            self.authorization_header(request)
+            authorization_header
             )
         email, password = self.extract_user_credentials(
             self.decode_base64_authorization_header(base_64_part)
         )
-        return self.user_object_from_credentials(email, password)
+        user = self.user_object_from_credentials(email, password)
+        if user is not None:
+            self.cache_user(authorization_header, user)
+        return user
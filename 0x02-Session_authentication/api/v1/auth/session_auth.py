@@ -2,37 +2,87 @@
 """
     API Session Authentication manager module
 """
+from datetime import datetime
 from api.v1.auth.auth import Auth
+from api.v1.auth.session_store import (MemorySessionStore, SessionStore,
+                                       session_store_from_env)
+from api.v1.auth.session_user_cache import SessionUserCache
 from models.user import User
 from typing import List, TypeVar
+import os
 import uuid
 
 
 class SessionAuth(Auth):
-    """Session Auth Class"""
+    """Session Auth Class
+
+    Sessions are kept in a SessionStore chosen by SESSION_STORE, by
+    default in the process-local user_id_by_session_id dict. Resolved
+    users are cached for SESSION_USER_CACHE_TTL seconds (5), up to
+    SESSION_USER_CACHE_SIZE sessions (4096)
+    """
     user_id_by_session_id = {}
 
+    def __init__(self) -> None:
+        super().__init__()
+        self.session_store = session_store_from_env(self.default_store)
+        try:
+            ttl = float(os.getenv('SESSION_USER_CACHE_TTL'))
+        except Exception:
+            ttl = 5
+        try:
+            maxsize = int(os.getenv('SESSION_USER_CACHE_SIZE'))
+        except Exception:
+            maxsize = 4096
+        self.user_cache = SessionUserCache(maxsize, ttl)
+
+    def default_store(self) -> SessionStore:
+        """returns the session store used when SESSION_STORE is not set"""
+        return MemorySessionStore(self.user_id_by_session_id)
+
     def create_session(self, user_id: str = None) -> str:
         """creates a Session ID for a user_id"""
         if user_id is None or not isinstance(user_id, str):
             return None
         session_id = str(uuid.uuid4())
-        self.user_id_by_session_id[f'{session_id}'] = user_id
+        if not self.session_store.put(session_id, user_id,
+                                      datetime.utcnow()):
+            return None
         return session_id
 
     def user_id_for_session_id(self, session_id: str = None) -> str:
         """returns a User ID based on a Session ID"""
         if session_id is None or not isinstance(session_id, str):
             return None
-        return self.user_id_by_session_id.get(session_id, None)
+        record = self.session_store.get(session_id)
+        if record is None:
+            return None
+        return record.get('user_id')
+
+    def resolve_session(self, session_id: str) -> tuple:
+        """returns the User ID of a Session ID, and for how many seconds
+        it can be cached (None: the cache TTL)"""
+        return self.user_id_for_session_id(session_id), None
+
+    def session_used(self, session_id: str) -> None:
+        """records the use of a session resolved from the cache"""
 
     def current_user(self, request=None):
         """ gets the current logged in user
             Return:
             - the current user
         """
-        user_id = self.user_id_for_session_id(self.session_cookie(request))
-        return User.get(user_id)
+        session_id = self.session_cookie(request)
+        user = self.user_cache.get(session_id)
+        # a cached user removed since then is not returned
+        if user is not None and User.get(user.id) is user:
+            self.session_used(session_id)
+            return user
+        user_id, ttl = self.resolve_session(session_id)
+        user = User.get(user_id)
+        if user is not None:
+            self.user_cache.put(session_id, user, ttl)
+        return user
 
     def destroy_session(self, request=None) -> bool:
         """deletes a user session / logout"""
@@ -44,5 +94,5 @@ class SessionAuth(Auth):
         user_id = self.user_id_for_session_id(session_id)
         if not user_id:
             return False
-        del self.user_id_by_session_id[session_id]
-        return True
+        self.user_cache.invalidate_session(session_id)
+        return self.session_store.delete(session_id)
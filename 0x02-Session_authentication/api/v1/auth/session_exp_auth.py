@@ -2,42 +2,223 @@
 """Module of Session Expiration Authentication"""
 from datetime import datetime, timedelta
 from api.v1.auth.session_auth import SessionAuth
+import heapq
 import os
+import threading
+import time
 
 
 class SessionExpAuth(SessionAuth):
-    """class of Session Expiration Authentication"""
+    """class of Session Expiration Authentication
+
+    A session expires SESSION_DURATION seconds after its creation and, in
+    sliding mode, SESSION_IDLE_TIMEOUT seconds after its last access. Last
+    accesses are kept in memory and written to the session store at most
+    once every SESSION_TOUCH_INTERVAL seconds (60) per session, clamped to
+    half the idle timeout so that other processes see a session in use
+    before it times out. Last accesses older than the idle timeout are
+    forgotten once per idle timeout, as are those of sessions missing
+    from the store.
+
+    The sessions created by this process are tracked in a min-heap ordered
+    by expiration date, a reaper thread deletes the expired ones from the
+    session store every SESSION_REAP_INTERVAL seconds (60). With 0, there
+    is no reaper and no heap, expired sessions are only deleted when
+    used. Those left over by previous processes are deleted on startup.
+    """
     def __init__(self) -> None:
         super().__init__()
         try:
             self.session_duration = int(os.getenv('SESSION_DURATION'))
         except Exception:
             self.session_duration = 0
+        try:
+            self.idle_timeout = int(os.getenv('SESSION_IDLE_TIMEOUT'))
+        except Exception:
+            self.idle_timeout = 0
+        try:
+            self.touch_interval = float(os.getenv('SESSION_TOUCH_INTERVAL'))
+        except Exception:
+            self.touch_interval = 60
+        if self.idle_timeout > 0:
+            self.touch_interval = min(self.touch_interval,
+                                      self.idle_timeout / 2)
+        try:
+            self.reap_interval = float(os.getenv('SESSION_REAP_INTERVAL'))
+        except Exception:
+            self.reap_interval = 60
+        self._expiry_heap = []
+        self._expires_at = {}
+        self._last_access = {}
+        self._next_prune = datetime.utcnow()
+        self._expiry_lock = threading.Lock()
+        self.evicted_sessions = 0
+        expiring = self.session_duration > 0 or self.idle_timeout > 0
+        self._reaping = expiring and self.reap_interval > 0
+        if expiring:
+            self.evicted_sessions += self.expire_left_over_sessions()
+        if self._reaping:
+            threading.Thread(target=self._reaper, daemon=True).start()
+
+    def expire_left_over_sessions(self) -> int:
+        """deletes the expired sessions of the store, whatever process
+        created them"""
+        now = datetime.utcnow()
+        before = idle_before = None
+        if self.session_duration > 0:
+            before = now - timedelta(seconds=self.session_duration)
+        if self.idle_timeout > 0:
+            # the stored last access may lag by up to the touch interval
+            idle_before = now - timedelta(
+                seconds=self.idle_timeout + self.touch_interval)
+        return self.session_store.expire(before, idle_before)
+
+    def expires_at(self, created_at: datetime,
+                   last_access: datetime) -> datetime:
+        """returns the expiration date of a session, or None"""
+        expires_at = []
+        if self.session_duration > 0:
+            expires_at.append(created_at +
+                              timedelta(seconds=self.session_duration))
+        if self.idle_timeout > 0:
+            expires_at.append(last_access +
+                              timedelta(seconds=self.idle_timeout))
+        return min(expires_at) if expires_at else None
 
     def create_session(self, user_id: str = None) -> str:
         """creates a Session ID for a user_id"""
         session_id = super().create_session(user_id)
-        if not session_id:
-            return None
-        self.user_id_by_session_id[session_id] = {
-            'user_id': user_id,
-            'created_at': datetime.now()
-        }
+        if session_id is not None:
+            now = datetime.utcnow()
+            expires_at = self.expires_at(now, now)
+            if expires_at is not None and self._reaping:
+                self.track_expiry(session_id, expires_at, now)
         return session_id
 
+    def track_expiry(self, session_id: str, expires_at: datetime,
+                     created_at: datetime) -> None:
+        """schedules (or reschedules) the eviction of a session"""
+        with self._expiry_lock:
+            self._expires_at[session_id] = expires_at
+            heapq.heappush(self._expiry_heap,
+                           (expires_at, session_id, created_at))
+
     def user_id_for_session_id(self, session_id: str = None) -> str:
         """returns a User ID based on a Session ID"""
+        return self.resolve_session(session_id)[0]
+
+    def resolve_session(self, session_id: str) -> tuple:
+        """returns the User ID of a Session ID, and the number of seconds
+        until it expires (None if it doesn't)"""
         if session_id is None or not isinstance(session_id, str):
-            return None
-        if session_id not in self.user_id_by_session_id.keys():
-            return None
-        if self.session_duration <= 0:
-            return self.user_id_by_session_id.get(session_id).get('user_id')
-        created_at = self.user_id_by_session_id.get(session_id
-                                                    ).get('created_at', None)
+            return None, None
+        record = self.session_store.get(session_id)
+        if record is None:
+            if session_id in self._last_access:
+                # deleted by another process
+                with self._expiry_lock:
+                    self._last_access.pop(session_id, None)
+            return None, None
+        if self.session_duration <= 0 and self.idle_timeout <= 0:
+            return record.get('user_id'), None
+        created_at = record.get('created_at', None)
         if not created_at:
-            return None
-        if (created_at + timedelta(seconds=self.session_duration)) < datetime.\
-                now():
-            return None
-        return self.user_id_by_session_id.get(session_id).get('user_id')
+            return None, None
+        now = datetime.utcnow()
+        stored_access = record.get('last_access') or created_at
+        last_access = max(stored_access,
+                          self._last_access.get(session_id, created_at))
+        if self.expires_at(created_at, last_access) < now:
+            self.expired_session(session_id)
+            return None, None
+        if self.idle_timeout > 0:
+            self._last_access[session_id] = now
+            if now - stored_access >= timedelta(seconds=self.touch_interval):
+                self.session_store.touch(session_id, now)
+            if now >= self._next_prune:
+                self.prune_last_access(now)
+        expires_in = self.expires_at(created_at, now) - now
+        return record.get('user_id'), expires_in.total_seconds()
+
+    def session_used(self, session_id: str) -> None:
+        """records the use of a session resolved from the cache, which
+        holds it no longer than until it expires"""
+        if self.idle_timeout > 0:
+            self._last_access[session_id] = datetime.utcnow()
+
+    def prune_last_access(self, now: datetime) -> None:
+        """forgets the last accesses too old for their sessions to be
+        alive, whatever process created them"""
+        before = now - timedelta(seconds=self.idle_timeout)
+        with self._expiry_lock:
+            self._next_prune = now + timedelta(seconds=self.idle_timeout)
+            for session_id, last_access in list(self._last_access.items()):
+                if last_access < before:
+                    del self._last_access[session_id]
+
+    def expired_session(self, session_id: str) -> None:
+        """deletes an expired session"""
+        self.user_cache.invalidate_session(session_id)
+        with self._expiry_lock:
+            self._expires_at.pop(session_id, None)
+            self._last_access.pop(session_id, None)
+            if self.session_store.delete(session_id):
+                self.evicted_sessions += 1
+
+    def destroy_session(self, request=None) -> bool:
+        """deletes a user session / logout"""
+        session_id = self.session_cookie(request) if request else None
+        destroyed = super().destroy_session(request)
+        if destroyed:
+            with self._expiry_lock:
+                self._expires_at.pop(session_id, None)
+                self._last_access.pop(session_id, None)
+        return destroyed
+
+    def reap_expired_sessions(self) -> int:
+        """deletes the tracked sessions which have expired"""
+        now = datetime.utcnow()
+        candidates = []
+        with self._expiry_lock:
+            while self._expiry_heap and self._expiry_heap[0][0] <= now:
+                entry = heapq.heappop(self._expiry_heap)
+                # entries of destroyed or renewed sessions are stale
+                if self._expires_at.get(entry[1]) == entry[0]:
+                    candidates.append(entry)
+        expired = []
+        for expires_at, session_id, created_at in candidates:
+            if self.idle_timeout > 0:
+                # the session may have been used since it was scheduled,
+                # by this process or, through the store, by another one
+                record = self.session_store.get(session_id) or {}
+                last_access = max(record.get('last_access') or created_at,
+                                  self._last_access.get(session_id,
+                                                        created_at))
+                renewed_at = self.expires_at(created_at, last_access)
+                if renewed_at > now:
+                    self.track_expiry(session_id, renewed_at, created_at)
+                    continue
+            expired.append(session_id)
+        with self._expiry_lock:
+            for session_id in expired:
+                self.user_cache.invalidate_session(session_id)
+                self._expires_at.pop(session_id, None)
+                self._last_access.pop(session_id, None)
+        count = self.session_store.delete_many(expired) if expired else 0
+        with self._expiry_lock:
+            self.evicted_sessions += count
+        return count
+
+    def _reaper(self) -> None:
+        """reaps the expired sessions forever"""
+        while True:
+            time.sleep(self.reap_interval)
+            try:
+                self.reap_expired_sessions()
+            except Exception:
+                pass
+
+    def session_metrics(self) -> dict:
+        """returns the number of live and evicted sessions"""
+        return {'live': len(self._expires_at),
+                'evicted': self.evicted_sessions}
@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+"""
+    Session storage backends module
+
+A session store maps a session ID to a record
+{'user_id': str, 'created_at': datetime, 'last_access': datetime}
+with naive UTC dates
+"""
+from datetime import datetime
+from models.base import to_epoch, from_epoch
+from multiprocessing import resource_tracker, shared_memory
+from typing import Callable, Iterable, List
+import fcntl
+import hashlib
+import os
+import sqlite3
+import struct
+import threading
+
+
+class SessionStore:
+    """Interface of the session storage backends"""
+    def get(self, session_id: str) -> dict:
+        """returns the record of a session, or None"""
+        raise NotImplementedError
+
+    def put(self, session_id: str, user_id: str,
+            created_at: datetime) -> bool:
+        """stores a session, returns False if it can't be stored"""
+        raise NotImplementedError
+
+    def touch(self, session_id: str, accessed_at: datetime) -> bool:
+        """records the last access to a session"""
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> bool:
+        """deletes a session, returns False if it doesn't exist"""
+        raise NotImplementedError
+
+    def delete_many(self, session_ids: List[str]) -> int:
+        """deletes several sessions, returns the number deleted"""
+        return sum(1 for session_id in session_ids if self.delete(session_id))
+
+    def expire(self, before: datetime = None,
+               idle_before: datetime = None) -> int:
+        """deletes the sessions created before a date, or last accessed
+        before idle_before, returns their number"""
+        raise NotImplementedError
+
+    def session_ids(self) -> List[str]:
+        """returns the IDs of all the sessions"""
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """Process-local session store"""
+    def __init__(self, sessions: dict = None) -> None:
+        self.sessions = sessions if sessions is not None else {}
+
+    def get(self, session_id: str) -> dict:
+        """returns the record of a session, or None"""
+        return self.sessions.get(session_id)
+
+    def put(self, session_id: str, user_id: str,
+            created_at: datetime) -> bool:
+        """stores a session"""
+        self.sessions[session_id] = {'user_id': user_id,
+                                     'created_at': created_at,
+                                     'last_access': created_at}
+        return True
+
+    def touch(self, session_id: str, accessed_at: datetime) -> bool:
+        """records the last access to a session"""
+        record = self.sessions.get(session_id)
+        if record is None:
+            return False
+        record['last_access'] = accessed_at
+        return True
+
+    def delete(self, session_id: str) -> bool:
+        """deletes a session"""
+        return self.sessions.pop(session_id, None) is not None
+
+    def expire(self, before: datetime = None,
+               idle_before: datetime = None) -> int:
+        """deletes the sessions created before a date, or idle since
+        idle_before"""
+        expired = [session_id
+                   for session_id, record in list(self.sessions.items())
+                   if (before and record['created_at'] < before) or
+                   (idle_before and record['last_access'] < idle_before)]
+        for session_id in expired:
+            self.sessions.pop(session_id, None)
+        return len(expired)
+
+    def session_ids(self) -> List[str]:
+        """returns the IDs of all the sessions"""
+        return list(self.sessions.keys())
+
+
+class UserSessionStore(SessionStore):
+    """Session store persisted with the UserSession model"""
+    def __init__(self) -> None:
+        from models.user_session import UserSession
+        self.model = UserSession
+        UserSession.load_from_file()
+
+    def _find(self, session_id: str):
+        """returns the UserSession of a session ID, or None"""
+        user_sessions = self.model.search({'session_id': session_id})
+        return user_sessions[0] if user_sessions else None
+
+    def get(self, session_id: str) -> dict:
+        """returns the record of a session, or None"""
+        user_session = self._find(session_id)
+        if user_session is None:
+            return None
+        return {'user_id': user_session.user_id,
+                'created_at': user_session.created_at,
+                'last_access': user_session.updated_at}
+
+    def put(self, session_id: str, user_id: str,
+            created_at: datetime) -> bool:
+        """stores a session"""
+        user_session = self.model(user_id=user_id, session_id=session_id)
+        user_session.created_at = created_at
+        user_session.save()
+        return True
+
+    def touch(self, session_id: str, accessed_at: datetime) -> bool:
+        """records the last access to a session as its update date"""
+        user_session = self._find(session_id)
+        if user_session is None:
+            return False
+        user_session.save()
+        return True
+
+    def delete(self, session_id: str) -> bool:
+        """deletes a session"""
+        user_session = self._find(session_id)
+        if user_session is None:
+            return False
+        user_session.remove()
+        return True
+
+    def delete_many(self, session_ids: List[str]) -> int:
+        """deletes several sessions with a single write"""
+        user_sessions = filter(None, (self._find(session_id)
+                                      for session_id in session_ids))
+        return self.model.remove_many(user_sessions)
+
+    def expire(self, before: datetime = None,
+               idle_before: datetime = None) -> int:
+        """deletes the sessions created before a date, or not updated
+        since idle_before"""
+        return self.model.remove_many(
+            [user_session for user_session in self.model.all()
+             if (before and user_session.created_at < before) or
+             (idle_before and user_session.updated_at < idle_before)])
+
+    def session_ids(self) -> List[str]:
+        """returns the IDs of all the sessions"""
+        return [user_session.session_id
+                for user_session in self.model.all()]
+
+
+class SQLiteSessionStore(SessionStore):
+    """Session store shared by the processes through a SQLite file"""
+    def __init__(self, file_path: str) -> None:
+        self.file_path = file_path
+        self._local = threading.local()
+        self._connection.executescript(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY,"
+            " user_id TEXT NOT NULL,"
+            " created_at INTEGER NOT NULL,"
+            " last_access INTEGER NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS sessions_created_at"
+            " ON sessions (created_at);")
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        """Memoized connection of the current thread"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.file_path, timeout=5,
+                                         isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, session_id: str) -> dict:
+        """returns the record of a session, or None"""
+        row = self._connection.execute(
+            "SELECT user_id, created_at, last_access FROM sessions"
+            " WHERE session_id = ?", (session_id,)).fetchone()
+        if row is None:
+            return None
+        return {'user_id': row[0], 'created_at': from_epoch(row[1]),
+                'last_access': from_epoch(row[2])}
+
+    def put(self, session_id: str, user_id: str,
+            created_at: datetime) -> bool:
+        """stores a session"""
+        self._connection.execute(
+            "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?)",
+            (session_id, user_id, to_epoch(created_at),
+             to_epoch(created_at)))
+        return True
+
+    def touch(self, session_id: str, accessed_at: datetime) -> bool:
+        """records the last access to a session"""
+        cursor = self._connection.execute(
+            "UPDATE sessions SET last_access = ? WHERE session_id = ?",
+            (to_epoch(accessed_at), session_id))
+        return cursor.rowcount > 0
+
+    def delete(self, session_id: str) -> bool:
+        """deletes a session"""
+        cursor = self._connection.execute(
+            "DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        return cursor.rowcount > 0
+
+    def delete_many(self, session_ids: List[str]) -> int:
+        """deletes several sessions in one transaction"""
+        with self._connection:
+            self._connection.execute("BEGIN")
+            cursor = self._connection.executemany(
+                "DELETE FROM sessions WHERE session_id = ?",
+                [(session_id,) for session_id in session_ids])
+        return cursor.rowcount
+
+    def expire(self, before: datetime = None,
+               idle_before: datetime = None) -> int:
+        """deletes the sessions created before a date, or idle since
+        idle_before"""
+        cursor = self._connection.execute(
+            "DELETE FROM sessions WHERE created_at < ? OR last_access < ?",
+            (to_epoch(before) if before else 0,
+             to_epoch(idle_before) if idle_before else 0))
+        return cursor.rowcount
+
+    def session_ids(self) -> List[str]:
+        """returns the IDs of all the sessions"""
+        return [row[0] for row in self._connection.execute(
+            "SELECT session_id FROM sessions")]
+
+
+class SharedMemorySessionStore(SessionStore):
+    """Session store shared by the processes of a host through a
+    fixed-size open addressing hash table in shared memory
+
+    The segment starts with the number of slots, then each slot holds a
+    state byte (empty, used or deleted), the session ID, the user ID, the
+    creation date and the last access date. Every access holds both a
+    thread lock and an exclusive flock on a lock file in TMPDIR.
+
+    Sessions are probed linearly over at most MAX_PROBES slots. Deleting
+    shifts the following sessions of the probe chain back instead of
+    leaving a deleted slot, so lookups stay short under churn (deleted
+    slots are only left by older versions).
+    """
+    HEADER = struct.Struct('<q')
+    SLOT = struct.Struct('<B64s64sqq')
+    EMPTY, USED, DELETED = 0, 1, 2
+    MAX_PROBES = 1024
+
+    def __init__(self, name: str, capacity: int) -> None:
+        self._lock = threading.Lock()
+        self._lock_file = open(os.path.join(
+            os.getenv('TMPDIR', '/tmp'), '{}.lock'.format(name)), 'a')
+        self._acquire()
+        try:
+            try:
+                self._shm = shared_memory.SharedMemory(
+                    name=name, create=True,
+                    size=self.HEADER.size + self.SLOT.size * capacity)
+                self.HEADER.pack_into(self._shm.buf, 0, capacity)
+            except FileExistsError:
+                self._shm = shared_memory.SharedMemory(name=name)
+            # the segment outlives the process that created it
+            resource_tracker.unregister(self._shm._name, 'shared_memory')
+            self.capacity = self.HEADER.unpack_from(self._shm.buf, 0)[0]
+        finally:
+            self._release()
+
+    def _acquire(self):
+        """locks the table for the current thread and process"""
+        self._lock.acquire()
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+
+    def _release(self):
+        """unlocks the table"""
+        fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+        self._lock.release()
+
+    def _offset(self, slot: int) -> int:
+        """position of a slot in the segment"""
+        return self.HEADER.size + slot * self.SLOT.size
+
+    def _home(self, session_id: str) -> int:
+        """first slot to probe for a session ID"""
+        digest = hashlib.blake2b(session_id.encode(), digest_size=8).digest()
+        return int.from_bytes(digest, 'little') % self.capacity
+
+    def _slots(self, session_id: str) -> Iterable[int]:
+        """slot indexes to probe for a session ID"""
+        start = self._home(session_id)
+        for i in range(min(self.capacity, self.MAX_PROBES)):
+            yield (start + i) % self.capacity
+
+    def _delete_slot(self, hole: int) -> None:
+        """empties a slot, moving back the sessions after it in the probe
+        chain that could no longer be reached"""
+        slot = hole
+        for _ in range(self.capacity - 1):
+            slot = (slot + 1) % self.capacity
+            state, session_id = self._read(slot)[:2]
+            if state == self.EMPTY:
+                break
+            if state != self.USED:
+                continue
+            # distance from the home slot of the session to the hole and to
+            # its slot: it moves if the hole is on its probe chain
+            home = self._home(session_id)
+            if (hole - home) % self.capacity < \
+                    (slot - home) % self.capacity:
+                start = self._offset(slot)
+                self._shm.buf[self._offset(hole):
+                              self._offset(hole) + self.SLOT.size] = \
+                    self._shm.buf[start:start + self.SLOT.size]
+                hole = slot
+        self._shm.buf[self._offset(hole)] = self.EMPTY
+
+    def _read(self, slot: int) -> tuple:
+        """state, session ID, user ID, creation and last access dates of a
+        slot"""
+        state, session_id, user_id, created_at, last_access = \
+            self.SLOT.unpack_from(self._shm.buf, self._offset(slot))
+        return (state, session_id.rstrip(b'\0').decode(),
+                user_id.rstrip(b'\0').decode(), created_at, last_access)
+
+    def _find(self, session_id: str) -> int:
+        """slot of a session ID, or None"""
+        for slot in self._slots(session_id):
+            state, slot_session_id = self._read(slot)[:2]
+            if state == self.EMPTY:
+                return None
+            if state == self.USED and slot_session_id == session_id:
+                return slot
+        return None
+
+    def get(self, session_id: str) -> dict:
+        """returns the record of a session, or None"""
+        self._acquire()
+        try:
+            slot = self._find(session_id)
+            if slot is None:
+                return None
+            _, _, user_id, created_at, last_access = self._read(slot)
+            return {'user_id': user_id, 'created_at': from_epoch(created_at),
+                    'last_access': from_epoch(last_access)}
+        finally:
+            self._release()
+
+    def put(self, session_id: str, user_id: str,
+            created_at: datetime) -> bool:
+        """stores a session, returns False if the table is full"""
+        if len(session_id.encode()) > 64 or len(user_id.encode()) > 64:
+            return False
+        self._acquire()
+        try:
+            target = self._find(session_id)
+            if target is None:
+                for slot in self._slots(session_id):
+                    if self._read(slot)[0] != self.USED:
+                        target = slot
+                        break
+            if target is None:
+                return False
+            self.SLOT.pack_into(self._shm.buf, self._offset(target),
+                                self.USED, session_id.encode(),
+                                user_id.encode(), to_epoch(created_at),
+                                to_epoch(created_at))
+            return True
+        finally:
+            self._release()
+
+    def touch(self, session_id: str, accessed_at: datetime) -> bool:
+        """records the last access to a session"""
+        self._acquire()
+        try:
+            slot = self._find(session_id)
+            if slot is None:
+                return False
+            _, _, user_id, created_at, _ = self._read(slot)
+            self.SLOT.pack_into(self._shm.buf, self._offset(slot),
+                                self.USED, session_id.encode(),
+                                user_id.encode(), created_at,
+                                to_epoch(accessed_at))
+            return True
+        finally:
+            self._release()
+
+    def delete(self, session_id: str) -> bool:
+        """deletes a session"""
+        self._acquire()
+        try:
+            slot = self._find(session_id)
+            if slot is None:
+                return False
+            self._delete_slot(slot)
+            return True
+        finally:
+            self._release()
+
+    def expire(self, before: datetime = None,
+               idle_before: datetime = None) -> int:
+        """deletes the sessions created before a date, or idle since
+        idle_before"""
+        before = to_epoch(before) if before else 0
+        idle_before = to_epoch(idle_before) if idle_before else 0
+        count = 0
+        self._acquire()
+        try:
+            slot = 0
+            while slot < self.capacity:
+                state, _, _, created_at, last_access = self._read(slot)
+                if state == self.USED and (created_at < before or
+                                           last_access < idle_before):
+                    # a following session may be moved into the slot
+                    self._delete_slot(slot)
+                    count += 1
+                else:
+                    slot += 1
+            return count
+        finally:
+            self._release()
+
+    def session_ids(self) -> List[str]:
+        """returns the IDs of all the sessions"""
+        self._acquire()
+        try:
+            buf = self._shm.buf
+            return [self._read(slot)[1] for slot in range(self.capacity)
+                    if buf[self._offset(slot)] == self.USED]
+        finally:
+            self._release()
+
+
+def session_store_from_env(default: Callable[[], SessionStore]
+                           ) -> SessionStore:
+    """returns the session store selected by SESSION_STORE
+
+    SESSION_STORE=sqlite uses SESSION_STORE_PATH (.db_sessions.sqlite3),
+    SESSION_STORE=shm uses the segment SESSION_STORE_NAME (user_sessions)
+    with SESSION_STORE_CAPACITY slots (65536), anything else calls default
+    """
+    store = os.getenv('SESSION_STORE')
+    if store == 'sqlite':
+        return SQLiteSessionStore(
+            os.getenv('SESSION_STORE_PATH', '.db_sessions.sqlite3'))
+    if store == 'shm':
+        try:
+            capacity = int(os.getenv('SESSION_STORE_CAPACITY'))
+        except Exception:
+            capacity = 65536
+        return SharedMemorySessionStore(
+            os.getenv('SESSION_STORE_NAME', 'user_sessions'), capacity)
+    return default()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+    API Stateless Session Token Authentication manager module
+"""
+from datetime import datetime
+from api.v1.auth.auth import Auth
+from api.v1.auth.session_store import (MemorySessionStore,
+                                       session_store_from_env)
+from models.user import User
+from typing import TypeVar
+import base64
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+import uuid
+
+
+def b64encode(data: bytes) -> str:
+    """unpadded URL-safe base64 encoding, safe in a cookie value"""
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def b64decode(data: str) -> bytes:
+    """decodes unpadded URL-safe base64"""
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+class SessionTokenAuth(Auth):
+    """Session Token Authentication class
+
+    The session cookie is a self-contained token carrying the user ID,
+    the expiration date and a token ID, signed with HMAC-SHA256 using
+    SESSION_SECRET, so it is verified without any session lookup. Every
+    worker must share the same SESSION_SECRET, and tokens expire after
+    SESSION_DURATION seconds: both must be set.
+
+    Logged out tokens are revoked until they expire, by storing their
+    token ID, dated by their expiration date, in the SessionStore chosen
+    by SESSION_STORE. By default it is process-local, so logging out
+    only holds in every worker with a shared store (sqlite or shm).
+    Tokens are checked against an in-process copy of the revoked IDs,
+    read again from the store every SESSION_REVOCATION_REFRESH seconds
+    (5): a logout holds at once in its worker, and within that delay in
+    the others. Revocations of expired tokens are purged at most once a
+    minute.
+    """
+    purge_interval = 60
+
+    def __init__(self) -> None:
+        super().__init__()
+        secret = os.getenv('SESSION_SECRET')
+        if not secret:
+            raise ValueError("SESSION_SECRET must be set")
+        self._secret = secret.encode()
+        try:
+            self.session_duration = int(os.getenv('SESSION_DURATION'))
+        except Exception:
+            self.session_duration = 0
+        if self.session_duration <= 0:
+            raise ValueError("SESSION_DURATION must be set")
+        try:
+            self.refresh_interval = float(
+                os.getenv('SESSION_REVOCATION_REFRESH'))
+        except Exception:
+            self.refresh_interval = 5
+        self.revocations = session_store_from_env(MemorySessionStore)
+        self._revoked = set()
+        self._revoked_lock = threading.Lock()
+        self._next_refresh = 0
+        self._next_purge = 0
+
+    def _sign(self, payload: bytes) -> bytes:
+        """returns the signature of a token payload"""
+        return hmac.new(self._secret, payload, hashlib.sha256).digest()
+
+    def create_session(self, user_id: str = None) -> str:
+        """creates a signed session token for a user_id"""
+        if user_id is None or not isinstance(user_id, str):
+            return None
+        expires_at = int(time.time()) + self.session_duration
+        payload = json.dumps([user_id, expires_at, uuid.uuid4().hex],
+                             separators=(',', ':')).encode()
+        return '{}.{}'.format(b64encode(payload),
+                              b64encode(self._sign(payload)))
+
+    def _verify(self, session_id: str) -> list:
+        """returns [user_id, expires_at, token_id] of a valid token"""
+        if session_id is None or not isinstance(session_id, str):
+            return None
+        try:
+            payload, signature = session_id.split('.')
+            payload = b64decode(payload)
+            signature = b64decode(signature)
+        except Exception:
+            return None
+        if not hmac.compare_digest(self._sign(payload), signature):
+            return None
+        user_id, expires_at, token_id = json.loads(payload)
+        now = time.time()
+        if not expires_at or expires_at < now:
+            return None
+        if now >= self._next_refresh:
+            self.refresh_revocations(now)
+        if token_id in self._revoked:
+            return None
+        return [user_id, expires_at, token_id]
+
+    def refresh_revocations(self, now: float) -> None:
+        """reads the revoked token IDs from the store, once per refresh
+        interval, after purging the expired ones once per purge interval
+        """
+        with self._revoked_lock:
+            if now < self._next_refresh:
+                return
+            self._next_refresh = now + self.refresh_interval
+            if now >= self._next_purge:
+                self._next_purge = now + self.purge_interval
+                self.revocations.expire(datetime.utcfromtimestamp(now))
+            self._revoked = set(self.revocations.session_ids())
+
+    def user_id_for_session_id(self, session_id: str = None) -> str:
+        """returns the User ID of a valid session token"""
+        token = self._verify(session_id)
+        if token is None:
+            return None
+        return token[0]
+
+    def current_user(self, request=None) -> TypeVar('User'):
+        """ gets the current logged in user
+            Return:
+            - the current user
+        """
+        user_id = self.user_id_for_session_id(self.session_cookie(request))
+        return User.get(user_id)
+
+    def destroy_session(self, request=None) -> bool:
+        """revokes a session token / logout"""
+        if request is None:
+            return False
+        token = self._verify(self.session_cookie(request))
+        if token is None:
+            return False
+        user_id, expires_at, token_id = token
+        with self._revoked_lock:
+            if not self.revocations.put(
+                    token_id, user_id, datetime.utcfromtimestamp(expires_at)):
+                return False
+            self._revoked.add(token_id)
+        return True
@@ -20,9 +20,12 @@ def stats() -> str:
     Return:
       - the number of each objects
     """
+    from api.v1.app import auth
     from models.user import User
     stats = {}
     stats['users'] = User.count()
+    if hasattr(auth, 'session_metrics'):
+        stats['sessions'] = auth.session_metrics()
     return jsonify(stats)
 
 
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Time of Auth.require_auth with a compiled PathMatcher, against the
+previous loop over the excluded paths
+
+usage: ./bench_excluded_paths.py [--exact N] [--wildcards N] [--paths N]
+"""
+from typing import List
+import argparse
+import random
+import re
+import string
+import time
+
+from api.v1.auth.auth import Auth, PathMatcher
+
+
+def require_auth_loop(path: str, excluded_paths: List[str]) -> bool:
+    """ Auth.require_auth as before PathMatcher """
+    if path is None or excluded_paths is None:
+        return True
+    if not path.endswith('/'):
+        path += '/'
+    for excluded_path in excluded_paths:
+        if excluded_path.endswith('*'):
+            if re.match(re.escape(excluded_path[:-1]), path):
+                return False
+        elif excluded_path == path:
+            return False
+    return True
+
+
+def random_path(rng: random.Random) -> str:
+    """ a path of 2 to 4 short segments under /api/v1/ """
+    return '/api/v1/' + '/'.join(
+        ''.join(rng.choice(string.ascii_lowercase[:6])
+                for _ in range(rng.randint(1, 3)))
+        for _ in range(rng.randint(2, 4))) + '/'
+
+
+def main() -> None:
+    """ prints the time per call of both implementations """
+    parser = argparse.ArgumentParser(description="Excluded paths benchmark")
+    parser.add_argument('--exact', type=int, default=300)
+    parser.add_argument('--wildcards', type=int, default=200)
+    parser.add_argument('--paths', type=int, default=20000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    excluded_paths = [random_path(rng) for _ in range(args.exact)] + [
+        random_path(rng)[:-rng.randint(1, 3)] + '*'
+        for _ in range(args.wildcards)]
+    paths = [rng.choice(excluded_paths).rstrip('*') if rng.random() < 0.3
+             else random_path(rng).rstrip('/')
+             for _ in range(args.paths)]
+
+    auth = Auth()
+    matcher = PathMatcher(excluded_paths)
+    for path in paths:
+        assert auth.require_auth(path, matcher) == \
+            require_auth_loop(path, excluded_paths), path
+    for name, call in (
+            ('loop', lambda path: require_auth_loop(path, excluded_paths)),
+            ('PathMatcher', lambda path: auth.require_auth(path, matcher)),
+            ('cached list', lambda path: auth.require_auth(path,
+                                                           excluded_paths))):
+        start = time.perf_counter()
+        for path in paths:
+            call(path)
+        elapsed = time.perf_counter() - start
+        print("{:12} {:8.2f} us per call".format(
+            name, elapsed / len(paths) * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Memory of slotted User instances with epoch timestamps, against the
+previous layout: attributes and datetime timestamps in a __dict__
+
+usage: ./bench_model_memory.py [--users N]
+"""
+from datetime import datetime, timedelta
+import argparse
+import tracemalloc
+import uuid
+
+from models.base import TIMESTAMP_FORMAT
+from models.user import User
+
+
+class DictUser:
+    """User laid out as before __slots__"""
+    def __init__(self, **kwargs: dict):
+        self.id = kwargs.get('id', str(uuid.uuid4()))
+        self.created_at = datetime.strptime(kwargs.get('created_at'),
+                                            TIMESTAMP_FORMAT)
+        self.updated_at = datetime.strptime(kwargs.get('updated_at'),
+                                            TIMESTAMP_FORMAT)
+        self.email = kwargs.get('email')
+        self._password = kwargs.get('_password')
+        self.first_name = kwargs.get('first_name')
+        self.last_name = kwargs.get('last_name')
+
+
+def rows(count: int) -> list:
+    """ JSON rows of count users, as read from .db_User.json """
+    start = datetime(2024, 1, 1)
+    return [{'id': str(uuid.uuid4()), 'email': 'user{}@hbtn.io'.format(i),
+             '_password': 'a' * 64, 'first_name': 'Bob', 'last_name': None,
+             'created_at': (start + timedelta(seconds=i)).strftime(
+                 TIMESTAMP_FORMAT),
+             'updated_at': (start + timedelta(seconds=i)).strftime(
+                 TIMESTAMP_FORMAT)}
+            for i in range(count)]
+
+
+def bytes_per_object(cls, users: list) -> float:
+    """ memory allocated per instance built from the rows """
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    objs = [cls(**user) for user in users]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'lineno'))
+    del objs
+    return size / len(users)
+
+
+def main() -> None:
+    """ prints the bytes per instance of both layouts """
+    parser = argparse.ArgumentParser(description="User memory benchmark")
+    parser.add_argument('--users', type=int, default=100000)
+    args = parser.parse_args()
+
+    users = rows(args.users)
+    for name, cls in (('__dict__ + datetime', DictUser),
+                      ('__slots__ + epoch', User)):
+        print("{:20} {:6.0f} bytes per object".format(
+            name, bytes_per_object(cls, users)))
+
+
+if __name__ == "__main__":
+    main()
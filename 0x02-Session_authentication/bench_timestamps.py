@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Time of building, serializing and loading User objects with the
+timestamp codec (fromisoformat/isoformat behind lru_cache), against
+strptime/strftime as before
+
+usage: ./bench_timestamps.py [--users N]
+
+The .db_User.json file is written in a temporary directory.
+"""
+from datetime import datetime, timedelta
+import argparse
+import os
+import tempfile
+import time
+import uuid
+
+import models.base as base
+from models.base import DATA, TIMESTAMP_FORMAT, to_epoch
+from models.user import User
+
+CODECS = {
+    'fast': (base.parse_timestamp, base.format_timestamp),
+    'strptime': (lambda value: to_epoch(datetime.strptime(
+                     value, TIMESTAMP_FORMAT)),
+                 lambda value: base.from_epoch(value).strftime(
+                     TIMESTAMP_FORMAT)),
+}
+
+
+def rows(count: int) -> list:
+    """ JSON rows of count users, one creation second each """
+    start = datetime(2024, 1, 1)
+    return [{'id': str(uuid.uuid4()), 'email': 'user{}@hbtn.io'.format(i),
+             '_password': 'a' * 64, 'first_name': 'Bob', 'last_name': None,
+             'created_at': (start + timedelta(seconds=i)).strftime(
+                 TIMESTAMP_FORMAT),
+             'updated_at': (start + timedelta(seconds=i)).strftime(
+                 TIMESTAMP_FORMAT)}
+            for i in range(count)]
+
+
+def timed(fn) -> float:
+    """ seconds taken by fn() """
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    """ prints the times of both codecs """
+    parser = argparse.ArgumentParser(description="Timestamp codec benchmark")
+    parser.add_argument('--users', type=int, default=200000)
+    args = parser.parse_args()
+
+    users = rows(args.users)
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        User.load_from_file()
+        for user in users:
+            DATA['User'][user['id']] = User(**user)
+        User.save_to_file()
+        for name, (parse, format) in CODECS.items():
+            base.parse_timestamp, base.format_timestamp = parse, format
+            objs = []
+            build = timed(lambda: objs.extend(User(**user)
+                                              for user in users))
+            to_json = timed(lambda: [obj.to_json(True) for obj in objs])
+            load = timed(User.load_from_file)
+            print("{:8} build {:.2f}s  to_json {:.2f}s  load_from_file "
+                  "{:.2f}s".format(name, build, to_json, load))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,147 @@
 #!/usr/bin/env python3
 """ Base module
 """
-from datetime import datetime
-from typing import TypeVar, List, Iterable
-from os import path
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import TypeVar, List, Iterable, Iterator
+from os import getenv, path
+import atexit
 import json
+import mmap
+import os
+import re
+import threading
 import uuid
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+TIMESTAMPS = ('created_at', 'updated_at')
+EPOCH = datetime(1970, 1, 1)
 DATA = {}
+ATTRIBUTES = {}
+INDEXES = {}
+INDEXED_VALUES = {}
+SORTED_IDS = {}
+
+# DB_STORAGE=journal appends one record per mutation to .db_<Class>.journal
+# instead of rewriting the whole .db_<Class>.json on every save/remove
+DB_STORAGE = getenv('DB_STORAGE', 'file')
+try:
+    DB_COMPACT_EVERY = int(getenv('DB_COMPACT_EVERY'))
+except Exception:
+    DB_COMPACT_EVERY = 1000
+# DB_DURABILITY=batched coalesces the mutations of a class into a single
+# flush every DB_FLUSH_EVERY mutations or DB_FLUSH_INTERVAL seconds
+DB_DURABILITY = getenv('DB_DURABILITY', 'sync')
+try:
+    DB_FLUSH_EVERY = int(getenv('DB_FLUSH_EVERY'))
+except Exception:
+    DB_FLUSH_EVERY = 100
+try:
+    DB_FLUSH_INTERVAL = float(getenv('DB_FLUSH_INTERVAL'))
+except Exception:
+    DB_FLUSH_INTERVAL = 0.05
+# DB_LOAD=lazy only indexes the offsets of the objects in .db_<Class>.json
+# at startup, each object is built the first time it is looked up
+DB_LOAD = getenv('DB_LOAD', 'eager')
+LAZY = {}
+# guards the mapped files and the move of their objects into DATA
+LAZY_LOCK = threading.RLock()
+JOURNALS = {}
+COMPACTING = set()
+PENDING = {}
+FLUSH_TIMER = None
+JOURNAL_LOCK = threading.RLock()
+
+
+def write_snapshot(file_path: str, objs_json: dict, raw: dict = {}):
+    """ Atomically and durably write objects to file, one object per line
+
+    raw holds objects already serialized, as read from a mapped file. The
+    file and its directory are synced, so the journals it replaces can be
+    deleted
+    """
+    lines = ["{}: {}".format(json.dumps(obj_id), json.dumps(obj_json))
+             for obj_id, obj_json in objs_json.items()]
+    lines.extend("{}: {}".format(json.dumps(obj_id), obj_text)
+                 for obj_id, obj_text in raw.items())
+    with open(file_path + ".tmp", 'w') as f:
+        f.write("{\n")
+        f.write(",\n".join(lines))
+        f.write("\n}\n" if lines else "}\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(file_path + ".tmp", file_path)
+    sync_directory(file_path)
+
+
+def sync_directory(file_path: str):
+    """ Sync the directory of a file, to persist its renames and deletions
+    """
+    fd = os.open(path.dirname(path.abspath(file_path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def load_value(value: bytes):
+    """ Decode a JSON value, plain strings and null without the parser
+    """
+    if value[:1] == b'"' and b'\\' not in value:
+        return value[1:-1].decode()
+    if value == b'null':
+        return None
+    return json.loads(value.decode())
+
+
+@lru_cache(maxsize=None)
+def attribute_pattern(attr: str):
+    """ Pattern of the JSON value of a top-level attribute in a line
+    written by write_snapshot
+    """
+    return re.compile(b'"' + re.escape(attr.encode()) +
+                      rb'": ("(?:[^"\\]|\\.)*"|[^,}]*)')
+
+
+def to_epoch(value: datetime) -> int:
+    """ Convert a naive UTC datetime to epoch seconds
+    """
+    return int((value - EPOCH).total_seconds())
+
+
+def from_epoch(value: int) -> datetime:
+    """ Convert epoch seconds to a naive UTC datetime
+    """
+    return EPOCH + timedelta(seconds=value)
+
+
+@lru_cache(maxsize=4096)
+def parse_timestamp(value: str) -> int:
+    """ Convert a TIMESTAMP_FORMAT string to epoch seconds
+    """
+    if len(value) == 19 and value[10] == 'T':
+        # fromisoformat parses exactly TIMESTAMP_FORMAT, much faster
+        return to_epoch(datetime.fromisoformat(value))
+    return to_epoch(datetime.strptime(value, TIMESTAMP_FORMAT))
+
+
+@lru_cache(maxsize=4096)
+def format_timestamp(value: int) -> str:
+    """ Convert epoch seconds to a TIMESTAMP_FORMAT string
+    """
+    return from_epoch(value).isoformat()
 
 
 class Base():
     """ Base class
+
+    Instances are slotted: subclasses declare their attributes in
+    __slots__, and timestamps are kept as epoch seconds
     """
+    __slots__ = ('id', '_created_at', '_updated_at')
+    _indexed_attributes = []
 
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
@@ -22,19 +149,57 @@ class Base():
         s_class = str(self.__class__.__name__)
         if DATA.get(s_class) is None:
             DATA[s_class] = {}
+            self.__class__._reset_indexes()
 
         self.id = kwargs.get('id', str(uuid.uuid4()))
         if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+            self._created_at = parse_timestamp(kwargs.get('created_at'))
         else:
             self.created_at = datetime.utcnow()
         if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
+            self._updated_at = parse_timestamp(kwargs.get('updated_at'))
         else:
             self.updated_at = datetime.utcnow()
 
+    @property
+    def created_at(self) -> datetime:
+        """ Getter of the creation date
+        """
+        return from_epoch(self._created_at)
+
+    @created_at.setter
+    def created_at(self, value: datetime):
+        """ Setter of the creation date
+        """
+        self._created_at = to_epoch(value)
+
+    @property
+    def updated_at(self) -> datetime:
+        """ Getter of the last update date
+        """
+        return from_epoch(self._updated_at)
+
+    @updated_at.setter
+    def updated_at(self, value: datetime):
+        """ Setter of the last update date
+        """
+        self._updated_at = to_epoch(value)
+
+    @classmethod
+    def _attributes(cls) -> List[str]:
+        """ Names of the slotted attributes, timestamps by property name
+        """
+        attributes = ATTRIBUTES.get(cls)
+        if attributes is None:
+            attributes = []
+            for klass in reversed(cls.__mro__):
+                for name in klass.__dict__.get('__slots__', ()):
+                    if name[1:] in TIMESTAMPS:
+                        name = name[1:]
+                    attributes.append(name)
+            ATTRIBUTES[cls] = attributes
+        return attributes
+
     def __eq__(self, other: TypeVar('Base')) -> bool:
         """ Equality
         """
@@ -48,7 +213,12 @@ class Base():
         """ Convert the object a JSON dictionary
         """
         result = {}
-        for key, value in self.__dict__.items():
+        items = [(key, format_timestamp(getattr(self, '_' + key))
+                  if key in TIMESTAMPS else getattr(self, key, None))
+                 for key in self.__class__._attributes()]
+        if hasattr(self, '__dict__'):
+            items.extend(self.__dict__.items())
+        for key, value in items:
             if not for_serialization and key[0] == '_':
                 continue
             if type(value) is datetime:
@@ -59,54 +229,403 @@ class Base():
 
     @classmethod
     def load_from_file(cls):
-        """ Load all objects from file
+        """ Load all objects from file, then replay the journal
         """
         s_class = cls.__name__
         file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
-            return
+        cls.flush()
+        with LAZY_LOCK:
+            DATA[s_class] = {}
+            cls._reset_indexes()
+            cls._close_lazy()
+            if DB_LOAD == 'lazy' and cls._load_offsets(file_path):
+                pass
+            elif path.exists(file_path):
+                with open(file_path, 'r') as f:
+                    objs_json = json.load(f)
+                    for obj_id, obj_json in objs_json.items():
+                        obj = cls(**obj_json)
+                        DATA[s_class][obj_id] = obj
+                        obj._index(track_id=False)
+
+            journal_path = ".db_{}.journal".format(s_class)
+            for file_path in (journal_path + ".1", journal_path):
+                if path.exists(file_path):
+                    cls._replay_journal(file_path)
+            # sorted once, rather than kept sorted while loading
+            ids = set(DATA[s_class].keys())
+            if s_class in LAZY:
+                ids.update(LAZY[s_class]['offsets'].keys())
+            SORTED_IDS[s_class] = sorted(ids)
 
+    @classmethod
+    def _load_offsets(cls, file_path: str) -> bool:
+        """ Map the file and index the position of every object in it
+
+        Returns False when the file is not in the one-object-per-line
+        layout written by write_snapshot
+        """
+        if not path.exists(file_path) or path.getsize(file_path) == 0:
+            return False
+        f = open(file_path, 'rb')
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        offsets = {}
+        attrs = [(attr, attribute_pattern(attr))
+                 for attr in cls._indexed_attributes]
+        index = {attr: {} for attr, _ in attrs}
+        values = {}
+        if mm.readline() != b"{\n":
+            mm.close()
+            f.close()
+            return False
+        while True:
+            start = mm.tell()
+            line = mm.readline()
+            if line in (b"}\n", b"}", b""):
+                break
+            sep = line.find(b'": ')
+            if sep < 0:
+                mm.close()
+                f.close()
+                return False
+            end = start + len(line.rstrip(b",\n"))
+            obj_id = load_value(line[:sep + 1])
+            offsets[obj_id] = (start + sep + 3, end)
+            if attrs:
+                obj_values = {}
+                for attr, pattern in attrs:
+                    match = pattern.search(line, sep)
+                    value = load_value(match.group(1)) if match else None
+                    try:
+                        index[attr].setdefault(value, set()).add(obj_id)
+                    except TypeError:
+                        continue
+                    obj_values[attr] = value
+                values[obj_id] = obj_values
+        LAZY[cls.__name__] = {'file': f, 'mmap': mm, 'offsets': offsets,
+                              'index': index, 'values': values}
+        return True
+
+    @classmethod
+    def _close_lazy(cls):
+        """ Release the mapped file of the class, only when it is loaded
+        again: other threads may still be reading from it until then
+        """
+        lazy = LAZY.pop(cls.__name__, None)
+        if lazy is not None:
+            lazy['mmap'].close()
+            lazy['file'].close()
+
+    @classmethod
+    def _materialize(cls, obj_id: str) -> TypeVar('Base'):
+        """ Build an object still pending in the mapped file, or return
+        it if another thread just built it
+        """
+        s_class = cls.__name__
+        with LAZY_LOCK:
+            lazy = LAZY.get(s_class)
+            if lazy is None or obj_id not in lazy['offsets']:
+                return DATA[s_class].get(obj_id)
+            offset = cls._forget_pending(obj_id)
+            obj = cls(**json.loads(lazy['mmap'][offset[0]:offset[1]]))
+            DATA[s_class][obj_id] = obj
+            obj._index()
+            return obj
+
+    @classmethod
+    def _materialize_all(cls):
+        """ Build every object still pending in the mapped file
+        """
+        with LAZY_LOCK:
+            lazy = LAZY.get(cls.__name__)
+            if lazy is None:
+                return
+            for obj_id in list(lazy['offsets'].keys()):
+                cls._materialize(obj_id)
+
+    @classmethod
+    def _replay_journal(cls, file_path: str):
+        """ Apply the records of a journal file on the loaded objects,
+        leaving the sorted IDs to load_from_file
+        """
+        s_class = cls.__name__
         with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # partially written last record
+                    continue
+                if record.get('op') == 'save':
+                    obj = cls(**record.get('obj'))
+                    cls._forget_pending(obj.id)
+                    DATA[s_class][obj.id] = obj
+                    obj._index(track_id=False)
+                elif record.get('op') == 'remove':
+                    cls._forget_pending(record.get('id'))
+                    obj = DATA[s_class].pop(record.get('id'), None)
+                    if obj is not None:
+                        obj._unindex(keep_id=True)
+
+    @classmethod
+    def _forget_pending(cls, obj_id: str) -> tuple:
+        """ Drop an object from the mapped file index without building
+        it, and return its offsets
+        """
+        with LAZY_LOCK:
+            lazy = LAZY.get(cls.__name__)
+            if lazy is None:
+                return None
+            for attr, value in lazy['values'].pop(obj_id, {}).items():
+                ids = lazy['index'][attr].get(value)
+                if ids is not None:
+                    ids.discard(obj_id)
+                    if len(ids) == 0:
+                        del lazy['index'][attr][value]
+            return lazy['offsets'].pop(obj_id, None)
+
+    @classmethod
+    def _pending_json(cls) -> dict:
+        """ Serialized objects still pending in the mapped file
+        """
+        with LAZY_LOCK:
+            lazy = LAZY.get(cls.__name__)
+            if lazy is None:
+                return {}
+            mm = lazy['mmap']
+            return {obj_id: mm[start:end].decode()
+                    for obj_id, (start, end) in lazy['offsets'].items()}
+
+    @classmethod
+    def append_to_journal(cls, *records: dict):
+        """ Append mutation records to the journal file
+        """
+        s_class = cls.__name__
+        with JOURNAL_LOCK:
+            journal = JOURNALS.get(s_class)
+            if journal is None:
+                journal = {
+                    'file': open(".db_{}.journal".format(s_class), 'a'),
+                    'count': 0
+                }
+                JOURNALS[s_class] = journal
+            journal['file'].write(
+                "".join(json.dumps(record) + "\n" for record in records))
+            journal['file'].flush()
+            # once per save/remove in sync mode, per group when batched
+            os.fsync(journal['file'].fileno())
+            journal['count'] += len(records)
+            if journal['count'] >= DB_COMPACT_EVERY and \
+                    s_class not in COMPACTING:
+                COMPACTING.add(s_class)
+                threading.Thread(target=cls.compact, daemon=True).start()
+
+    @classmethod
+    def compact(cls):
+        """ Fold the journal into a new .db_<Class>.json snapshot
+
+        The journal is rotated to .db_<Class>.journal.1 so that new
+        mutations keep being appended while the snapshot is written
+        """
+        s_class = cls.__name__
+        file_path = ".db_{}.json".format(s_class)
+        journal_path = ".db_{}.journal".format(s_class)
+        with JOURNAL_LOCK:
+            journal = JOURNALS.pop(s_class, None)
+            if journal is not None:
+                journal['file'].close()
+            if not path.exists(journal_path):
+                pass
+            elif path.exists(journal_path + ".1"):
+                # left over by an interrupted compaction: keep its records
+                with open(journal_path, 'r') as src, \
+                        open(journal_path + ".1", 'a') as dst:
+                    dst.write(src.read())
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                os.remove(journal_path)
+            else:
+                os.replace(journal_path, journal_path + ".1")
+            raw = cls._pending_json()
+            objs = list(DATA[s_class].items())
+
+        try:
+            objs_json = {}
+            for obj_id, obj in objs:
+                objs_json[obj_id] = obj.to_json(True)
+            write_snapshot(file_path, objs_json, raw)
+            if path.exists(journal_path + ".1"):
+                os.remove(journal_path + ".1")
+        finally:
+            with JOURNAL_LOCK:
+                COMPACTING.discard(s_class)
 
     @classmethod
     def save_to_file(cls):
-        """ Save all objects to file
+        """ Save all objects to file, and in file storage mode delete the
+        journals left by the journal mode
         """
         s_class = cls.__name__
         file_path = ".db_{}.json".format(s_class)
+        # objects not built yet are copied as is from the mapped file
+        raw = cls._pending_json()
         objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
+        # other threads may add objects while they are serialized
+        for obj_id, obj in list(DATA[s_class].items()):
             objs_json[obj_id] = obj.to_json(True)
-
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+        write_snapshot(file_path, objs_json, raw)
+        if DB_STORAGE != 'journal':
+            # replayed on load, so already in the snapshot: replaying
+            # them again would undo the mutations saved since
+            journal_path = ".db_{}.journal".format(s_class)
+            removed = False
+            for journal in (journal_path + ".1", journal_path):
+                if path.exists(journal):
+                    os.remove(journal)
+                    removed = True
+            if removed:
+                sync_directory(journal_path)
 
     def save(self):
         """ Save current object
         """
         s_class = self.__class__.__name__
         self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        with LAZY_LOCK:
+            self.__class__._forget_pending(self.id)
+            DATA[s_class][self.id] = self
+            self._index()
+        self.__class__._persist({'op': 'save', 'obj': self.to_json(True)})
 
     def remove(self):
         """ Remove object
         """
         s_class = self.__class__.__name__
+        self.__class__._materialize(self.id)
         if DATA[s_class].get(self.id) is not None:
             del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+            self._unindex()
+            self.__class__._persist({'op': 'remove', 'id': self.id})
+
+    @classmethod
+    def remove_many(cls, objs: Iterable[TypeVar('Base')]) -> int:
+        """ Remove several objects, written to file at once
+        """
+        s_class = cls.__name__
+        records = []
+        for obj in objs:
+            cls._materialize(obj.id)
+            if DATA[s_class].pop(obj.id, None) is not None:
+                obj._unindex()
+                records.append({'op': 'remove', 'id': obj.id})
+        if len(records) > 0:
+            cls._persist(*records)
+        return len(records)
+
+    @classmethod
+    def _persist(cls, *records: dict):
+        """ Write mutations now, or queue them for the next group commit
+        """
+        global FLUSH_TIMER
+        if DB_DURABILITY != 'batched':
+            if DB_STORAGE == 'journal':
+                cls.append_to_journal(*records)
+            else:
+                cls.save_to_file()
+            return
+
+        with JOURNAL_LOCK:
+            pending = PENDING.setdefault(cls.__name__,
+                                         {'cls': cls, 'records': []})
+            pending['records'].extend(records)
+            if len(pending['records']) >= DB_FLUSH_EVERY:
+                cls.flush()
+            elif FLUSH_TIMER is None:
+                FLUSH_TIMER = threading.Timer(DB_FLUSH_INTERVAL, Base.flush)
+                FLUSH_TIMER.daemon = True
+                FLUSH_TIMER.start()
+
+    @classmethod
+    def flush(cls):
+        """ Write all queued mutations (of every class when called on Base)
+        """
+        global FLUSH_TIMER
+        with JOURNAL_LOCK:
+            if cls is Base:
+                s_classes = list(PENDING.keys())
+                if FLUSH_TIMER is not None:
+                    FLUSH_TIMER.cancel()
+                    FLUSH_TIMER = None
+            else:
+                s_classes = [cls.__name__]
+            for s_class in s_classes:
+                pending = PENDING.pop(s_class, None)
+                if pending is None:
+                    continue
+                if DB_STORAGE == 'journal':
+                    pending['cls'].append_to_journal(*pending['records'])
+                else:
+                    pending['cls'].save_to_file()
+
+    @classmethod
+    def _reset_indexes(cls):
+        """ Drop and recreate the secondary indexes of the class
+        """
+        s_class = cls.__name__
+        INDEXES[s_class] = {attr: {} for attr in cls._indexed_attributes}
+        INDEXED_VALUES[s_class] = {}
+        SORTED_IDS[s_class] = []
+
+    def _index(self, track_id: bool = True):
+        """ Add (or move) the current object in the secondary indexes,
+        and in the sorted IDs if track_id
+        """
+        s_class = self.__class__.__name__
+        self._unindex(keep_id=True)
+        values = {}
+        for attr, index in INDEXES[s_class].items():
+            value = getattr(self, attr, None)
+            try:
+                index.setdefault(value, {})[self.id] = self
+            except TypeError:
+                continue
+            values[attr] = value
+        INDEXED_VALUES[s_class][self.id] = values
+        if not track_id:
+            return
+        ids = SORTED_IDS[s_class]
+        i = bisect_left(ids, self.id)
+        if i == len(ids) or ids[i] != self.id:
+            ids.insert(i, self.id)
+
+    def _unindex(self, keep_id: bool = False):
+        """ Remove the current object from the secondary indexes, and
+        from the sorted IDs unless keep_id
+        """
+        s_class = self.__class__.__name__
+        values = INDEXED_VALUES[s_class].pop(self.id, {})
+        for attr, value in values.items():
+            bucket = INDEXES[s_class][attr].get(value)
+            if bucket is None:
+                continue
+            bucket.pop(self.id, None)
+            if len(bucket) == 0:
+                del INDEXES[s_class][attr][value]
+        if keep_id:
+            return
+        ids = SORTED_IDS[s_class]
+        i = bisect_left(ids, self.id)
+        if i < len(ids) and ids[i] == self.id:
+            del ids[i]
 
     @classmethod
     def count(cls) -> int:
         """ Count all objects
         """
         s_class = cls.__name__
-        return len(DATA[s_class].keys())
+        lazy = LAZY.get(s_class)
+        pending = len(lazy['offsets']) if lazy is not None else 0
+        return len(DATA[s_class].keys()) + pending
 
     @classmethod
     def all(cls) -> Iterable[TypeVar('Base')]:
@@ -114,18 +633,59 @@ class Base():
         """
         return cls.search()
 
+    @classmethod
+    def iter_by_id(cls, after: str = None) -> Iterator[TypeVar('Base')]:
+        """ Iterate over the objects ordered by ID, starting after the ID
+        after, building pending objects one at a time
+        """
+        ids = SORTED_IDS[cls.__name__]
+        while True:
+            # looked up again each time: the list may change meanwhile
+            i = bisect_right(ids, after) if after is not None else 0
+            if i >= len(ids):
+                return
+            after = ids[i]
+            obj = cls.get(after)
+            if obj is not None:
+                yield obj
+
     @classmethod
     def get(cls, id: str) -> TypeVar('Base'):
         """ Return one object by ID
         """
         s_class = cls.__name__
-        return DATA[s_class].get(id)
+        obj = DATA[s_class].get(id)
+        if obj is None and s_class in LAZY:
+            obj = cls._materialize(id)
+        return obj
 
     @classmethod
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
         """ Search all objects with matching attributes
+
+        Equality on an indexed attribute is resolved through the index,
+        other attributes are checked by scanning the candidates. Only the
+        candidates still pending in a mapped file are built
         """
         s_class = cls.__name__
+        objs = None
+        for k, v in attributes.items():
+            index = INDEXES[s_class].get(k)
+            if index is None:
+                continue
+            try:
+                with LAZY_LOCK:
+                    lazy = LAZY.get(s_class)
+                    if lazy is not None:
+                        for obj_id in list(lazy['index'][k].get(v, ())):
+                            cls._materialize(obj_id)
+                objs = list(index.get(v, {}).values())
+            except TypeError:
+                continue
+            break
+        if objs is None:
+            cls._materialize_all()
+            objs = DATA[s_class].values()
 
         def _search(obj):
             if len(attributes) == 0:
@@ -135,4 +695,7 @@ class Base():
                     return False
             return True
 
-        return list(filter(_search, DATA[s_class].values()))
+        return list(filter(_search, objs))
+
+
+atexit.register(Base.flush)
@@ -8,6 +8,9 @@ from models.base import Base
 
 class UserSession(Base):
     """User session model"""
+    __slots__ = ('user_id', 'session_id')
+    _indexed_attributes = ['session_id', 'user_id']
+
     def __init__(self, *args: list, **kwargs: dict):
         """Initialize a UserSession instance"""
         super().__init__(*args, **kwargs)
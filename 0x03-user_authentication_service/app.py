@@ -11,6 +11,12 @@ AUTH = Auth()
 app = Flask(__name__)
 
 
+@app.teardown_appcontext
+def close_db_session(exception=None) -> None:
+    """ releases the DB session of the request """
+    AUTH.close_db_session()
+
+
 @app.route('/', methods=['GET'])
 def greet() -> str:
     """ returns json message """
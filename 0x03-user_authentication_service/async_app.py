@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Module for the async (ASGI) app, with the routes of app.py
+
+run with an ASGI server, e.g. hypercorn async_app:app
+"""
+
+from quart import (Quart, jsonify, redirect, request,
+                   abort, make_response, url_for)
+from async_auth import AsyncAuth
+
+
+AUTH = AsyncAuth()
+
+app = Quart(__name__)
+
+
+@app.route('/', methods=['GET'])
+async def greet() -> str:
+    """ returns json message """
+    return jsonify({"message": "Bienvenue"}), 200
+
+
+@app.route('/users', methods=['POST'])
+async def register() -> str:
+    """registers a new user"""
+    form = await request.form
+    email = form.get('email')
+    password = form.get('password')
+    try:
+        user = await AUTH.register_user(email, password)
+        return jsonify({"email": user.email, "message": "user created"}), 200
+    except ValueError:
+        return jsonify({"message": "email already registered"}), 400
+
+
+@app.route('/sessions', methods=['POST'])
+async def login() -> str:
+    """create new session and log a user in"""
+    form = await request.form
+    email = form.get('email')
+    password = form.get('password')
+    if not await AUTH.valid_login(email, password):
+        abort(401)
+    session_id = await AUTH.create_session(email)
+    response = await make_response(
+        jsonify({"email": email, "message": "logged in"}))
+    response.set_cookie('session_id', session_id)
+    return response
+
+
+@app.route('/sessions', methods=['DELETE'])
+async def logout() -> str:
+    """ this route handle logout of a user """
+    session_id = request.cookies.get('session_id')
+    user = await AUTH.get_user_from_session_id(session_id)
+    if user is None:
+        abort(403)
+    await AUTH.destroy_session(user.id)
+    return redirect(url_for('greet'))
+
+
+@app.route('/profile', methods=['GET'])
+async def current_user() -> str:
+    """ returns the current user profile """
+    session_id = request.cookies.get('session_id', None)
+    if session_id is None:
+        abort(403)
+    user = await AUTH.get_user_from_session_id(session_id)
+    if user is None:
+        abort(403)
+    return jsonify({"email": user.email}), 200
+
+
+@app.route('/reset_password', methods=['POST'])
+async def get_reset_password_token() -> str:
+    """ this handle the retrieval of the password reset token  """
+    form = await request.form
+    email = form.get('email')
+    try:
+        reset_token = await AUTH.get_reset_password_token(email)
+        return jsonify({"email": email, "reset_token": reset_token}), 200
+    except ValueError:
+        abort(403)
+
+
+@app.route('/reset_password', methods=['PUT'])
+async def update_password() -> str:
+    """ this handle the updating of the user password """
+    form = await request.form
+    email = form.get('email')
+    new_password = form.get('new_password')
+    reset_token = form.get('reset_token')
+    try:
+        await AUTH.update_password(reset_token, new_password)
+        return jsonify({"email": email, "message": "Password updated"}), 200
+    except ValueError:
+        abort(403)
+
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port="5000")
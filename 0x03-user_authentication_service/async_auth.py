@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+""" Module for async Authentication """
+
+from async_db import AsyncDB
+from auth import Auth, _detached_copy, _generate_uuid
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import NoResultFound
+
+from user import User
+
+
+class AsyncAuth(Auth):
+    """Awaitable version of Auth
+
+    Queries run on AsyncDB and passwords are hashed and checked with the
+    async API of password_hasher, so neither blocks the event loop.
+    """
+
+    def __init__(self) -> None:
+        """initilization of class instance"""
+        super().__init__()
+        self._async_db = AsyncDB(self._db)
+
+    async def register_user(self, email: str, password: str) -> User:
+        """ register a new user """
+        try:
+            if await self._async_db.find_user_by(email=email):
+                raise ValueError(f"User {email} already exists")
+        except NoResultFound:
+            password = await self.password_hasher.hash_async(password)
+            try:
+                return await self._async_db.add_user(
+                    email, password.decode('utf8'))
+            except IntegrityError:
+                # registered concurrently
+                raise ValueError(f"User {email} already exists")
+
+    async def valid_login(self, email: str, password: str) -> bool:
+        """validates a user"""
+        try:
+            user = await self._async_db.find_user_by(email=email)
+        except NoResultFound:
+            return False
+        if not await self.password_hasher.check_async(
+                password, user.hashed_password):
+            return False
+        if self.password_hasher.needs_rehash(user.hashed_password):
+            await self._rehash_async(user, password)
+        return True
+
+    async def _rehash_async(self, user: User, password: str) -> None:
+        """ hashes the password of a user again with the current work
+        factor, unless it was changed meanwhile
+        """
+        try:
+            password = await self.password_hasher.hash_async(password)
+            await self._async_db.update_user_by(
+                {'id': user.id, 'hashed_password': user.hashed_password},
+                hashed_password=password.decode('utf8'))
+        except Exception:
+            pass
+
+    async def create_session(self, email: str) -> str:
+        """generate a session id for a user"""
+        try:
+            session_id = _generate_uuid()
+            user_id = await self._async_db.update_user_by(
+                {'email': email}, session_id=session_id)
+            if user_id is None:
+                return None
+            self.user_cache.invalidate_user(user_id)
+            return session_id
+
+        except Exception:
+            return None
+
+    async def get_user_from_session_id(self, session_id: str) -> User:
+        """ finds a user by session id"""
+        if session_id is None:
+            return None
+        user = self.user_cache.get(session_id)
+        if user is not None:
+            return user
+        try:
+            user = _detached_copy(
+                await self._async_db.find_user_by(session_id=session_id))
+            self.user_cache.put(session_id, user)
+            return user
+        except Exception:
+            return None
+
+    async def destroy_session(self, user_id: int) -> None:
+        """destroys a user current session"""
+        if user_id is None:
+            return None
+        self.user_cache.invalidate_user(user_id)
+        try:
+            await self._async_db.update_user(user_id, session_id=None)
+        except Exception:
+            return None
+
+    async def get_reset_password_token(self, email: str) -> str:
+        """ generate a password reset token """
+        if email is None:
+            return None
+        try:
+            reset_token = _generate_uuid()
+            user_id = await self._async_db.update_user_by(
+                {'email': email}, reset_token=reset_token)
+        except Exception:
+            raise ValueError
+        if user_id is None:
+            raise ValueError
+        return reset_token
+
+    async def update_password(self, reset_token: str, password: str) -> None:
+        """update a users password"""
+        if reset_token is None or password is None:
+            return None
+        try:
+            user = await self._async_db.find_user_by(reset_token=reset_token)
+            password = await self.password_hasher.hash_async(password)
+            await self._async_db.update_user(
+                user.id, reset_token=None,
+                hashed_password=password.decode('utf-8'))
+            self.user_cache.invalidate_user(user.id)
+        except Exception:
+            raise ValueError
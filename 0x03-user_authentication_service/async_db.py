@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+""" Async DB module """
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.pool import QueuePool
+from typing import Iterable, Optional
+import asyncio
+import functools
+
+from db import DB
+from user import User
+
+
+class AsyncDB:
+    """Awaitable version of DB
+
+    Every call runs on a pool of as many threads as the DB can have
+    connections (DB_POOL_SIZE + DB_MAX_OVERFLOW, or one for an in-memory
+    database), so waiting coroutines never wait for a connection, and
+    the session of the thread is released when the call returns. Users
+    returned are detached from any session, with all their columns
+    loaded.
+    """
+
+    def __init__(self, db: DB = None) -> None:
+        """Initialize a new AsyncDB instance over db (a new DB)
+        """
+        self._db = db if db is not None else DB()
+        pool = self._db._engine.pool
+        workers = 1
+        if isinstance(pool, QueuePool):
+            workers = pool.size() + max(0, pool._max_overflow)
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='async_db')
+
+    def _call(self, method, *args, **kwargs):
+        """calls a DB method, then releases the session of the thread"""
+        try:
+            return method(*args, **kwargs)
+        finally:
+            self._db.close_session()
+
+    async def _run(self, method, *args, **kwargs):
+        """runs a DB method on the pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(
+            self._call, method, *args, **kwargs))
+
+    async def add_user(self, email: str, hashed_password: str) -> User:
+        """add a user to DB"""
+        return await self._run(self._db.add_user, email, hashed_password)
+
+    async def add_users(self, users: Iterable[dict],
+                        chunk_size: int = 1000) -> int:
+        """add users to DB, a transaction per chunk of chunk_size users,
+        skipping those already registered, and returns the number added"""
+        return await self._run(self._db.add_users, list(users), chunk_size)
+
+    async def update_users(self, updates: Iterable[dict],
+                           chunk_size: int = 1000) -> int:
+        """ updates users in DB, each dict holds the 'id' of a user, and
+        returns the number of users updated """
+        return await self._run(self._db.update_users, list(updates),
+                               chunk_size)
+
+    async def find_user_by(self, **kwargs: dict) -> User:
+        """ finds a user base on the given parameters """
+        return await self._run(self._db.find_user_by, **kwargs)
+
+    async def update_user(self, user_id: int, **kwargs: dict) -> None:
+        """ updates a user in DB """
+        return await self._run(self._db.update_user, user_id, **kwargs)
+
+    async def update_user_by(self, filters: dict,
+                             **kwargs: dict) -> Optional[int]:
+        """ updates the user matching filters and returns its id """
+        return await self._run(self._db.update_user_by, filters, **kwargs)
+
+    def close(self) -> None:
+        """stops the threads of the pool"""
+        self._executor.shutdown(wait=True)
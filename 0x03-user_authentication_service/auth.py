@@ -2,9 +2,11 @@
 """ Module for Authentication """
 
 from db import DB
-from sqlalchemy.exc import InvalidRequestError
+from password_hasher import hash_password, password_hasher_from_env
+from session_user_cache import SessionUserCache
+from sqlalchemy.exc import IntegrityError, InvalidRequestError
 from sqlalchemy.orm.exc import NoResultFound
-import bcrypt
+import os
 import uuid
 
 from user import User
@@ -12,7 +14,7 @@ from user import User
 
 def _hash_password(password: str) -> bytes:
     """ this function hashes a password """
-    return bcrypt.hashpw(password.encode('utf8'), bcrypt.gensalt())
+    return hash_password(password)
 
 
 def _generate_uuid() -> str:
@@ -20,13 +22,42 @@ def _generate_uuid() -> str:
     return (str(uuid.uuid4()))
 
 
+def _detached_copy(user: User) -> User:
+    """ copies a user into an object bound to no DB session """
+    return User(id=user.id, email=user.email,
+                hashed_password=user.hashed_password,
+                session_id=user.session_id, reset_token=user.reset_token)
+
+
 class Auth:
     """Auth class to interact with the authentication database.
+
+    Users resolved from a session ID are cached for SESSION_USER_CACHE_TTL
+    seconds (5), up to SESSION_USER_CACHE_SIZE sessions (4096).
+
+    Passwords are hashed and checked by password_hasher, a pool of
+    PASSWORD_HASHER_WORKERS workers (one per CPU) of the PASSWORD_HASHER
+    kind (thread, process or inline). A hash made with a lower work
+    factor than BCRYPT_ROUNDS is replaced on the next successful login.
     """
 
     def __init__(self) -> None:
         """initilization of class instance"""
         self._db = DB()
+        try:
+            ttl = float(os.getenv('SESSION_USER_CACHE_TTL'))
+        except Exception:
+            ttl = 5
+        try:
+            maxsize = int(os.getenv('SESSION_USER_CACHE_SIZE'))
+        except Exception:
+            maxsize = 4096
+        self.user_cache = SessionUserCache(maxsize, ttl)
+        self.password_hasher = password_hasher_from_env()
+
+    def close_db_session(self) -> None:
+        """ releases the DB session of the current thread """
+        self._db.close_session()
 
     def register_user(self, email: str, password: str) -> User:
         """ register a new user """
@@ -34,24 +65,49 @@ class Auth:
             if self._db.find_user_by(email=email):
                 raise ValueError(f"User {email} already exists")
         except NoResultFound:
-            password = _hash_password(password).decode('utf8')
-            return self._db.add_user(email, password)
+            # no DB connection is held while hashing
+            self._db.close_session()
+            password = self.password_hasher.hash(password).decode('utf8')
+            try:
+                return self._db.add_user(email, password)
+            except IntegrityError:
+                # registered concurrently
+                raise ValueError(f"User {email} already exists")
 
     def valid_login(self, email: str, password: str) -> bool:
         """validates a user"""
         try:
             user = self._db.find_user_by(email=email)
-            return bcrypt.checkpw(password.encode('utf-8'),
-                                  user.hashed_password.encode('utf-8'))
         except NoResultFound:
             return False
+        self._db.close_session()
+        if not self.password_hasher.check(password, user.hashed_password):
+            return False
+        if self.password_hasher.needs_rehash(user.hashed_password):
+            self._rehash(user, password)
+        return True
+
+    def _rehash(self, user: User, password: str) -> None:
+        """ hashes the password of a user again with the current work
+        factor, unless it was changed meanwhile
+        """
+        try:
+            self._db.update_user_by(
+                {'id': user.id, 'hashed_password': user.hashed_password},
+                hashed_password=self.password_hasher.hash(
+                    password).decode('utf8'))
+        except Exception:
+            pass
 
     def create_session(self, email: str) -> str:
         """generate a session id for a user"""
         try:
-            user = self._db.find_user_by(email=email)
             session_id = _generate_uuid()
-            self._db.update_user(user.id, session_id=session_id)
+            user_id = self._db.update_user_by({'email': email},
+                                              session_id=session_id)
+            if user_id is None:
+                return None
+            self.user_cache.invalidate_user(user_id)
             return session_id
 
         except Exception:
@@ -61,8 +117,12 @@ class Auth:
         """ finds a user by session id"""
         if session_id is None:
             return None
+        user = self.user_cache.get(session_id)
+        if user is not None:
+            return user
         try:
-            user = self._db.find_user_by(session_id=session_id)
+            user = _detached_copy(self._db.find_user_by(session_id=session_id))
+            self.user_cache.put(session_id, user)
             return user
         except Exception:
             return None
@@ -71,6 +131,7 @@ class Auth:
         """destroys a user current session"""
         if user_id is None:
             return None
+        self.user_cache.invalidate_user(user_id)
         try:
             user = self._db.update_user(user_id, session_id=None)
         except Exception:
@@ -81,12 +142,14 @@ class Auth:
         if email is None:
             return None
         try:
-            user = self._db.find_user_by(email=email)
             reset_token = _generate_uuid()
-            self._db.update_user(user.id, reset_token=reset_token)
-            return reset_token
+            user_id = self._db.update_user_by({'email': email},
+                                              reset_token=reset_token)
         except Exception:
             raise ValueError
+        if user_id is None:
+            raise ValueError
+        return reset_token
 
     def update_password(self, reset_token: str, password: str) -> None:
         """update a users password"""
@@ -94,8 +157,10 @@ class Auth:
             return None
         try:
             user = self._db.find_user_by(reset_token=reset_token)
-            password = _hash_password(password).decode('utf-8')
+            self._db.close_session()
+            password = self.password_hasher.hash(password).decode('utf-8')
             self._db.update_user(user.id, reset_token=None,
                                  hashed_password=password)
+            self.user_cache.invalidate_user(user.id)
         except Exception:
             raise ValueError
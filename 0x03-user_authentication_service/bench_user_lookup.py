@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Time of looking users up by email with the ix_users_email index, then
+without it as before
+
+usage: ./bench_user_lookup.py [--users N] [--lookups N]
+
+The database is created in a temporary directory.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+
+def timed_lookups(lookup, emails: list) -> float:
+    """ milliseconds per lookup """
+    start = time.perf_counter()
+    for email in emails:
+        assert lookup(email) is not None, email
+    return (time.perf_counter() - start) / len(emails) * 1000
+
+
+def main() -> None:
+    """ prints the time per lookup with and without the index """
+    parser = argparse.ArgumentParser(description="Email lookup benchmark")
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--lookups', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, 'a.db')
+        os.environ['DB_URL'] = 'sqlite:///' + file_path
+        os.environ['DB_MODE'] = 'persistent'
+        from db import DB
+        db = DB()
+        db.add_users({'email': 'user{}@hbtn.io'.format(i),
+                      'hashed_password': 'x'} for i in range(args.users))
+        db.close_session()
+        rng = random.Random(0)
+        emails = ['user{}@hbtn.io'.format(rng.randrange(args.users))
+                  for _ in range(args.lookups)]
+        # same settings and query as find_user_by, without the ORM
+        connection = sqlite3.connect(file_path)
+        DB._tune_sqlite(connection, None)
+
+        def raw(email):
+            return connection.execute(
+                "SELECT id FROM users WHERE email = ? LIMIT 1",
+                (email,)).fetchone()
+
+        def find(email):
+            user = db.find_user_by(email=email)
+            db.close_session()
+            return user
+
+        for label in ('index', 'no index'):
+            if label == 'no index':
+                connection.execute("DROP INDEX ix_users_email")
+            # a first scan loads the table in the page cache
+            raw(emails[0])
+            find(emails[0])
+            print("{:8}  sqlite3 {:8.3f} ms  find_user_by {:8.3f} ms".format(
+                label, timed_lookups(raw, emails),
+                timed_lookups(find, emails)))
+        connection.close()
+        db._engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,17 @@
 #!/usr/bin/env python3
 """ DB module """
-from sqlalchemy import create_engine
+from sqlalchemy import (bindparam, create_engine, event, insert, select,
+                        text, update)
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy.orm.session import Session
 from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.pool import QueuePool, StaticPool
+from itertools import islice
+from typing import Iterable, List, Optional
+import os
+import sqlite3
 # from typing import TypeVar
 
 from user import Base, User
@@ -13,57 +19,286 @@ from user import Base, User
 
 class DB:
     """DB class
+
+    The database is DB_URL (sqlite:///a.db). It is emptied on startup
+    unless DB_MODE is "persistent", in which case only the missing tables
+    and indexes are created.
+
+    Connections come from a pool of DB_POOL_SIZE connections (5) plus up
+    to DB_MAX_OVERFLOW extra ones (10), and each thread gets its own
+    session, released by close_session at the end of a request. Pooled
+    connections to a server are pinged before use, SQLite files are not.
+    An in-memory SQLite database lives in its connection, so all threads
+    share a single one.
+
+    SQLite connections use the WAL journal, DB_SQLITE_SYNCHRONOUS
+    (NORMAL), a busy timeout of DB_SQLITE_BUSY_TIMEOUT ms (5000) and
+    DB_SQLITE_MMAP_SIZE bytes of memory-mapped I/O (268435456).
     """
     __keys = ['id', 'email', 'hashed_password', 'session_id', 'reset_token']
 
     def __init__(self) -> None:
         """Initialize a new DB instance
         """
-        self._engine = create_engine("sqlite:///a.db", echo=False)
-        Base.metadata.drop_all(self._engine)
+        try:
+            pool_size = int(os.getenv('DB_POOL_SIZE'))
+        except Exception:
+            pool_size = 5
+        try:
+            max_overflow = int(os.getenv('DB_MAX_OVERFLOW'))
+        except Exception:
+            max_overflow = 10
+        url = os.getenv('DB_URL', "sqlite:///a.db")
+        connect_args = {}
+        sqlite = url.startswith('sqlite')
+        if sqlite:
+            connect_args['check_same_thread'] = False
+        if sqlite and (url in ('sqlite://', 'sqlite:///:memory:') or
+                       'mode=memory' in url):
+            pool_args = {'poolclass': StaticPool}
+        else:
+            pool_args = {'poolclass': QueuePool, 'pool_size': pool_size,
+                         'max_overflow': max_overflow}
+        self._engine = create_engine(
+            url, echo=False, pool_pre_ping=not sqlite,
+            connect_args=connect_args, **pool_args)
+        if self._engine.dialect.name == 'sqlite':
+            event.listen(self._engine, 'connect', self._tune_sqlite)
+        if os.getenv('DB_MODE') != 'persistent':
+            Base.metadata.drop_all(self._engine)
         Base.metadata.create_all(self._engine)
-        self.__session = None
+        self._create_indexes()
+        self.__session = scoped_session(
+            sessionmaker(bind=self._engine, expire_on_commit=False))
+
+    @staticmethod
+    def _tune_sqlite(connection, connection_record) -> None:
+        """Set the pragmas of a new SQLite connection
+        """
+        synchronous = os.getenv('DB_SQLITE_SYNCHRONOUS', 'NORMAL')
+        if synchronous.upper() not in ('OFF', 'NORMAL', 'FULL', 'EXTRA'):
+            synchronous = 'NORMAL'
+        try:
+            busy_timeout = int(os.getenv('DB_SQLITE_BUSY_TIMEOUT'))
+        except Exception:
+            busy_timeout = 5000
+        try:
+            mmap_size = int(os.getenv('DB_SQLITE_MMAP_SIZE'))
+        except Exception:
+            mmap_size = 268435456
+        cursor = connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous={}".format(synchronous))
+        cursor.execute("PRAGMA busy_timeout={}".format(busy_timeout))
+        cursor.execute("PRAGMA mmap_size={}".format(mmap_size))
+        cursor.close()
+
+    def _create_indexes(self) -> None:
+        """Add the indexes missing from tables created by older versions
+        """
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=self._engine, checkfirst=True)
 
     @property
     def _session(self) -> Session:
-        """Memoized session object
+        """Session object of the current thread
         """
-        if self.__session is None:
-            DBSession = sessionmaker(bind=self._engine)
-            self.__session = DBSession()
-        return self.__session
+        return self.__session()
+
+    def close_session(self) -> None:
+        """Release the session of the current thread
+        """
+        self.__session.remove()
 
     def add_user(self, email: str, hashed_password: str) -> User:
         """add a user to DB"""
         user = User(email=email, hashed_password=hashed_password)
-        if self.__session is None:
-            self._session
-        self.__session.add(user)
-        self.__session.commit()
+        session = self._session
+        try:
+            session.add(user)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
         return user
 
+    @staticmethod
+    def _chunks(rows: Iterable[dict], chunk_size: int) -> Iterable[List]:
+        """Split rows in lists of chunk_size rows
+        """
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    def add_users(self, users: Iterable[dict],
+                  chunk_size: int = 1000) -> int:
+        """add users ({'email', 'hashed_password'} dicts) to DB, with one
+        multi-row INSERT and one transaction per chunk of chunk_size users,
+        and returns the number added: users whose email is already taken
+        are skipped
+        """
+        session = self._session
+        count = 0
+        statement = self._insert_ignore()
+        for chunk in self._chunks(users, chunk_size):
+            try:
+                result = session.connection().execute(statement, [
+                    {'email': user['email'],
+                     'hashed_password': user['hashed_password']}
+                    for user in chunk])
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+            count += result.rowcount
+        return count
+
+    def _insert_ignore(self):
+        """returns an INSERT of users skipping the conflicting rows"""
+        dialect = self._engine.dialect.name
+        if dialect == 'sqlite':
+            return insert(User).prefix_with('OR IGNORE')
+        if dialect == 'mysql':
+            return insert(User).prefix_with('IGNORE')
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as pg_insert
+            return pg_insert(User).on_conflict_do_nothing()
+        return insert(User)
+
+    def update_users(self, updates: Iterable[dict],
+                     chunk_size: int = 1000) -> int:
+        """ updates users in DB: each dict holds the 'id' of a user and the
+        new values, the updates of a chunk with the same columns are sent
+        as a single executemany. Returns the number of users updated,
+        unknown ids are ignored
+        """
+        session = self._session
+        count = 0
+        for chunk in self._chunks(updates, chunk_size):
+            batches = {}
+            for row in chunk:
+                if 'id' not in row:
+                    raise ValueError("update without an 'id': {}".format(
+                        sorted(row.keys())))
+                keys = tuple(sorted(key for key in row.keys() if key != 'id'))
+                for key in keys:
+                    if key not in self.__keys:
+                        raise ValueError
+                if keys:
+                    batches.setdefault(keys, []).append(row)
+            try:
+                for keys, rows in batches.items():
+                    statement = update(User).where(
+                        User.id == bindparam('user_id')).values(
+                        {key: bindparam(key) for key in keys})
+                    result = session.connection().execute(statement, [
+                        dict({key: row[key] for key in keys},
+                             user_id=row['id']) for row in rows])
+                    count += result.rowcount
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+            # the rows loaded in the session are now outdated
+            session.expire_all()
+        return count
+
     def find_user_by(self, **kwargs: dict) -> User:
         """ finds a user base on the given parameters """
-        if self.__session is None:
-            self._session
-
         for key in kwargs.keys():
             if key not in self.__keys:
                 raise InvalidRequestError
 
-        query = self.__session.query(User).filter_by(**kwargs)
+        query = self._session.query(User).filter_by(**kwargs)
         user = query.first()
         if user is None:
             raise NoResultFound
         return user
 
     def update_user(self, user_id: int, **kwargs: dict) -> None:
-        """ updates a user in DB """
-        if self.__session is None:
-            self._session
-        user = self.find_user_by(id=user_id)
-        for key, val in kwargs.items():
+        """ updates a user in DB with a single UPDATE by id """
+        for key in kwargs.keys():
+            if key not in self.__keys:
+                raise ValueError
+        if not kwargs:
+            self.find_user_by(id=user_id)
+            return
+        session = self._session
+        try:
+            result = session.connection().execute(
+                update(User).where(User.id == user_id).values(**kwargs))
+            if result.rowcount == 0:
+                raise NoResultFound
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        # the row may be loaded in the session
+        session.expire_all()
+
+    def _update_returning(self) -> str:
+        """How update_user_by gets the id of the updated user: 'core'
+        when the dialect compiles UPDATE .. RETURNING, 'text' on SQLite
+        3.35+ (which SQLAlchemy 1.4 does not compile it for), else None
+        """
+        dialect = self._engine.dialect
+        if getattr(dialect, 'update_returning',
+                   getattr(dialect, 'full_returning', False)):
+            return 'core'
+        if (dialect.name == 'sqlite' and
+                sqlite3.sqlite_version_info >= (3, 35)):
+            return 'text'
+        return None
+
+    def update_user_by(self, filters: dict, **kwargs: dict) -> Optional[int]:
+        """ updates the user matching filters and returns its id, or None
+        when no user matches. With UPDATE .. RETURNING this is a single
+        statement, otherwise the id is SELECTed first
+        """
+        if not filters:
+            raise InvalidRequestError
+        if not kwargs:
+            raise ValueError
+        for key in filters.keys():
+            if key not in self.__keys:
+                raise InvalidRequestError
+        for key in kwargs.keys():
             if key not in self.__keys:
                 raise ValueError
-            setattr(user, key, val)
-        self.__session.commit()
+        session = self._session
+        returning = self._update_returning()
+        try:
+            connection = session.connection()
+            if returning == 'core':
+                user_id = connection.execute(
+                    update(User).filter_by(**filters).values(**kwargs)
+                    .returning(User.id)).scalar()
+            elif returning == 'text':
+                # the column names are checked against __keys above
+                statement = text(
+                    "UPDATE {} SET {} WHERE {} RETURNING id".format(
+                        User.__tablename__,
+                        ", ".join("{0} = :set_{0}".format(key)
+                                  for key in kwargs),
+                        " AND ".join("{0} = :where_{0}".format(key)
+                                     for key in filters)))
+                params = {'set_' + key: val for key, val in kwargs.items()}
+                params.update(
+                    {'where_' + key: val for key, val in filters.items()})
+                user_id = connection.execute(statement, params).scalar()
+            else:
+                user_id = connection.execute(
+                    select(User.id).filter_by(**filters)).scalar()
+                if user_id is not None:
+                    connection.execute(update(User).where(
+                        User.id == user_id).values(**kwargs))
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        session.expire_all()
+        return user_id
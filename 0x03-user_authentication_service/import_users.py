@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Bulk import of users from a CSV (email,password header) or JSONL
+({"email": ..., "password": ...} per line) file
+
+usage: ./import_users.py FILE [--workers N] [--chunk-size N]
+
+The database is opened in persistent mode unless DB_MODE is set. Users
+whose email is already registered are skipped and counted.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Iterable
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+
+def read_users(file_path: str) -> Iterable[dict]:
+    """ streams the {'email', 'password'} rows of a CSV or JSONL file """
+    with open(file_path, newline='') as f:
+        if file_path.endswith('.csv'):
+            for row in csv.DictReader(f):
+                yield row
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def hash_users(users: Iterable[dict], executor: ProcessPoolExecutor,
+               chunk_size: int) -> Iterable[dict]:
+    """ hashes the passwords of the users, a chunk at a time in parallel """
+    from db import DB
+    from password_hasher import bcrypt_rounds, hash_password
+
+    # calibrated once, here, rather than in every worker
+    rounds = bcrypt_rounds()
+    for chunk in DB._chunks(users, chunk_size):
+        hashes = executor.map(hash_password,
+                              [user['password'] for user in chunk],
+                              repeat(rounds),
+                              chunksize=max(1, chunk_size // 32))
+        for user, hashed in zip(chunk, hashes):
+            yield {'email': user['email'],
+                   'hashed_password': hashed.decode('utf8')}
+
+
+def main() -> None:
+    """ imports the users of a file and reports the throughput """
+    parser = argparse.ArgumentParser(description="Bulk import users")
+    parser.add_argument('file', help="CSV or JSONL file of users")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help="password hashing processes")
+    parser.add_argument('--chunk-size', type=int, default=1000,
+                        help="users per transaction")
+    args = parser.parse_args()
+
+    os.environ.setdefault('DB_MODE', 'persistent')
+    from db import DB
+    db = DB()
+
+    start = time.monotonic()
+    count = 0
+    skipped = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        users = hash_users(read_users(args.file), executor, args.chunk_size)
+        for chunk in DB._chunks(users, args.chunk_size):
+            added = db.add_users(chunk, args.chunk_size)
+            count += added
+            skipped += len(chunk) - added
+            elapsed = time.monotonic() - start
+            print("{} users imported, {} skipped ({:.0f} rows/s)".format(
+                count, skipped, (count + skipped) / elapsed),
+                file=sys.stderr)
+    elapsed = time.monotonic() - start
+    rows = count + skipped
+    print("{} users imported, {} skipped in {:.1f}s ({:.0f} rows/s)".format(
+        count, skipped, elapsed, rows / elapsed if elapsed else rows))
+
+
+if __name__ == "__main__":
+    main()
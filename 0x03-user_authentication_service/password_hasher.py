@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+    Password hashing worker pool module
+"""
+from concurrent.futures import (Executor, Future, ProcessPoolExecutor,
+                                ThreadPoolExecutor)
+from functools import lru_cache
+import asyncio
+import bcrypt
+import os
+import threading
+import time
+
+DEFAULT_ROUNDS = 12
+MIN_ROUNDS = 10
+MAX_ROUNDS = 16
+
+
+def calibrate_rounds(target_ms: float) -> int:
+    """ returns the highest work factor, between MIN_ROUNDS and
+    MAX_ROUNDS, hashing within target_ms milliseconds on this host:
+    a hash at 8 rounds is timed and each extra round doubles the time
+    """
+    salt = bcrypt.gensalt(8)
+    elapsed = float('inf')
+    for _ in range(3):
+        start = time.perf_counter()
+        bcrypt.hashpw(b'calibration', salt)
+        elapsed = min(elapsed, time.perf_counter() - start)
+    rounds = MIN_ROUNDS
+    while (rounds < MAX_ROUNDS and
+           elapsed * 2 ** (rounds + 1 - 8) * 1000 <= target_ms):
+        rounds += 1
+    return rounds
+
+
+@lru_cache(maxsize=None)
+def bcrypt_rounds() -> int:
+    """ returns the work factor of new hashes: BCRYPT_ROUNDS (12), or
+    with BCRYPT_ROUNDS=auto the one calibrated for BCRYPT_TARGET_MS
+    milliseconds (250) on first use
+    """
+    rounds = os.getenv('BCRYPT_ROUNDS')
+    if rounds == 'auto':
+        try:
+            target_ms = float(os.getenv('BCRYPT_TARGET_MS'))
+        except Exception:
+            target_ms = 250
+        return calibrate_rounds(target_ms)
+    try:
+        rounds = int(rounds)
+    except Exception:
+        return DEFAULT_ROUNDS
+    return rounds if 4 <= rounds <= 31 else DEFAULT_ROUNDS
+
+
+def hash_password(password: str, rounds: int = None) -> bytes:
+    """ hashes a password with a new salt of rounds (bcrypt_rounds()) """
+    return bcrypt.hashpw(password.encode('utf8'),
+                         bcrypt.gensalt(rounds or bcrypt_rounds()))
+
+
+def needs_rehash(hashed_password: str, rounds: int = None) -> bool:
+    """ tells whether a hash was made with a lower work factor than
+    rounds (bcrypt_rounds()): higher ones are kept, so that workers
+    calibrating different factors with BCRYPT_ROUNDS=auto don't keep
+    rehashing each other's hashes
+    """
+    try:
+        cost = int(hashed_password.split('$')[2])
+    except (IndexError, ValueError):
+        return True
+    return cost < (rounds or bcrypt_rounds())
+
+
+def check_password(password: str, hashed_password: str) -> bool:
+    """ checks a password against its hash """
+    return bcrypt.checkpw(password.encode('utf-8'),
+                          hashed_password.encode('utf-8'))
+
+
+class PasswordHasher:
+    """Runs bcrypt hashing and verification on a pool of workers
+
+    kind is "thread" (bcrypt releases the GIL), "process", or "inline"
+    to run on the calling thread. hash and check block until the result
+    is ready, hash_async and check_async can be awaited from an event
+    loop without blocking it. New hashes use rounds (bcrypt_rounds()).
+    """
+    def __init__(self, kind: str = 'thread', workers: int = None,
+                 rounds: int = None) -> None:
+        self.kind = kind
+        self.workers = workers or os.cpu_count() or 1
+        self.rounds = rounds or bcrypt_rounds()
+        self._executor = self._make_executor()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._max_pending = 0
+        self._completed = 0
+
+    def _make_executor(self) -> Executor:
+        """creates the pool of the kind of the hasher"""
+        if self.kind == 'process':
+            return ProcessPoolExecutor(max_workers=self.workers)
+        if self.kind == 'thread':
+            return ThreadPoolExecutor(max_workers=self.workers,
+                                      thread_name_prefix='password_hasher')
+        return None
+
+    def _submit(self, fn, *args) -> Future:
+        """runs fn(*args) on the pool, counting it until it is done"""
+        if self._executor is None:
+            future = Future()
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+            with self._lock:
+                self._completed += 1
+            return future
+        with self._lock:
+            self._pending += 1
+            if self._pending > self._max_pending:
+                self._max_pending = self._pending
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._done(None)
+            raise
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future: Future) -> None:
+        """stops counting a finished job"""
+        with self._lock:
+            self._pending -= 1
+            if future is not None:
+                self._completed += 1
+
+    def submit_hash(self, password: str) -> Future:
+        """returns a future of the hash of a password"""
+        return self._submit(hash_password, password, self.rounds)
+
+    def submit_check(self, password: str, hashed_password: str) -> Future:
+        """returns a future of the check of a password against its hash"""
+        return self._submit(check_password, password, hashed_password)
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        """tells whether a hash was made with a lower work factor"""
+        return needs_rehash(hashed_password, self.rounds)
+
+    def hash(self, password: str) -> bytes:
+        """hashes a password on the pool"""
+        return self.submit_hash(password).result()
+
+    def check(self, password: str, hashed_password: str) -> bool:
+        """checks a password against its hash on the pool"""
+        return self.submit_check(password, hashed_password).result()
+
+    async def hash_async(self, password: str) -> bytes:
+        """hashes a password on the pool without blocking the event loop"""
+        return await asyncio.wrap_future(self.submit_hash(password))
+
+    async def check_async(self, password: str,
+                          hashed_password: str) -> bool:
+        """checks a password on the pool without blocking the event loop"""
+        return await asyncio.wrap_future(
+            self.submit_check(password, hashed_password))
+
+    def metrics(self) -> dict:
+        """returns the queue depth of the pool: jobs pending (queued or
+        running), those waiting for a worker, the highest number pending
+        so far and the jobs completed
+        """
+        with self._lock:
+            return {
+                'kind': self.kind,
+                'workers': self.workers,
+                'rounds': self.rounds,
+                'pending': self._pending,
+                'queued': max(0, self._pending - self.workers),
+                'max_pending': self._max_pending,
+                'completed': self._completed,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """stops the workers"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+
+
+def password_hasher_from_env() -> PasswordHasher:
+    """returns the hasher selected by PASSWORD_HASHER ("thread",
+    "process" or "inline") with PASSWORD_HASHER_WORKERS workers (one per
+    CPU)
+    """
+    kind = os.getenv('PASSWORD_HASHER', 'thread')
+    if kind not in ('thread', 'process', 'inline'):
+        kind = 'thread'
+    try:
+        workers = int(os.getenv('PASSWORD_HASHER_WORKERS'))
+    except Exception:
+        workers = None
+    return PasswordHasher(kind, workers)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+    Session to user resolution cache module
+"""
+from collections import OrderedDict
+import threading
+import time
+
+
+class SessionUserCache:
+    """Bounded LRU cache of the user of a session ID
+
+    Entries expire after ttl seconds, which bounds how long a session
+    revoked by another process can still be resolved here. Logout,
+    password reset and user deletion must call invalidate_session or
+    invalidate_user.
+    """
+    def __init__(self, maxsize: int = 4096, ttl: float = 5) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._sessions_by_user = {}
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str):
+        """returns the cached user of a session ID, or None"""
+        if session_id is None or self.ttl <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at < time.monotonic():
+                self._pop(session_id)
+                return None
+            self._entries.move_to_end(session_id)
+            return user
+
+    def put(self, session_id: str, user, ttl: float = None) -> None:
+        """caches the user of a session ID, for at most ttl seconds when
+        the session expires sooner than the cache entry"""
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if session_id is None or user is None or ttl <= 0 or \
+                self.maxsize <= 0:
+            return
+        with self._lock:
+            self._pop(session_id)
+            self._entries[session_id] = (user, time.monotonic() + ttl)
+            self._sessions_by_user.setdefault(user.id, set()).add(session_id)
+            while len(self._entries) > self.maxsize:
+                self._pop(next(iter(self._entries)))
+
+    def invalidate_session(self, session_id: str) -> None:
+        """forgets a session ID"""
+        with self._lock:
+            self._pop(session_id)
+
+    def invalidate_user(self, user_id) -> None:
+        """forgets every session ID of a user"""
+        with self._lock:
+            for session_id in list(self._sessions_by_user.get(user_id, ())):
+                self._pop(session_id)
+
+    def _pop(self, session_id: str) -> None:
+        """removes an entry, the lock must be held"""
+        entry = self._entries.pop(session_id, None)
+        if entry is None:
+            return
+        user_id = entry[0].id
+        session_ids = self._sessions_by_user.get(user_id)
+        if session_ids is not None:
+            session_ids.discard(session_id)
+            if len(session_ids) == 0:
+                del self._sessions_by_user[user_id]
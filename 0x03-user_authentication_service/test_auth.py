@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Statement counts of the Auth session and reset token methods
+
+run with python3 -m unittest test_auth
+"""
+from sqlalchemy import event
+import os
+import tempfile
+import unittest
+
+
+class TestAuthStatements(unittest.TestCase):
+    """Counts the statements sent to the database by Auth methods"""
+
+    def setUp(self) -> None:
+        """creates an Auth on an empty SQLite file with one user"""
+        self._dir = tempfile.TemporaryDirectory()
+        self._env = {key: os.environ.get(key) for key in
+                     ('DB_URL', 'DB_MODE', 'BCRYPT_ROUNDS',
+                      'PASSWORD_HASHER')}
+        os.environ.update({
+            'DB_URL': 'sqlite:///' + os.path.join(self._dir.name, 'a.db'),
+            'DB_MODE': 'test',
+            'BCRYPT_ROUNDS': '4',
+            'PASSWORD_HASHER': 'inline',
+        })
+        from auth import Auth
+        self.auth = Auth()
+        self.user_id = self.auth.register_user('bob@bob.com', 'pwd').id
+        self.statements = []
+        event.listen(self.auth._db._engine, 'before_cursor_execute',
+                     self._count)
+
+    def tearDown(self) -> None:
+        """restores the environment and removes the database"""
+        event.remove(self.auth._db._engine, 'before_cursor_execute',
+                     self._count)
+        self.auth._db.close_session()
+        self.auth._db._engine.dispose()
+        self.auth.password_hasher.shutdown()
+        for key, value in self._env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        self._dir.cleanup()
+
+    def _count(self, conn, cursor, statement, parameters, context,
+               executemany) -> None:
+        """records a statement"""
+        self.statements.append(statement)
+
+    def _update_by_statements(self) -> int:
+        """statements of update_user_by: UPDATE ... RETURNING, or a
+        SELECT and an UPDATE without RETURNING"""
+        return 1 if self.auth._db._update_returning() else 2
+
+    def test_create_session(self) -> None:
+        """a session is created with update_user_by"""
+        self.assertIsNotNone(self.auth.create_session('bob@bob.com'))
+        self.assertEqual(len(self.statements), self._update_by_statements(),
+                         self.statements)
+
+    def test_get_reset_password_token(self) -> None:
+        """a reset token is issued with update_user_by"""
+        self.assertIsNotNone(
+            self.auth.get_reset_password_token('bob@bob.com'))
+        self.assertEqual(len(self.statements), self._update_by_statements(),
+                         self.statements)
+
+    def test_destroy_session(self) -> None:
+        """a session is destroyed with a single UPDATE by id"""
+        self.auth.create_session('bob@bob.com')
+        self.statements.clear()
+        self.auth.destroy_session(self.user_id)
+        self.assertEqual(len(self.statements), 1, self.statements)
+
+
+if __name__ == '__main__':
+    unittest.main()